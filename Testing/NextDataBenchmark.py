@@ -0,0 +1,42 @@
+# micro-benchmark of the byte level __NEXT_DATA__ extractor against a full BeautifulSoup parse of saved video pages
+# usage: python Testing/NextDataBenchmark.py <directory with saved video pages (*.html)> [repetitions]
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.NextData import extract_next_data_fast, extract_next_data_soup
+
+
+def benchmark(pages_directory, repetitions=20):
+    """
+    Time both extractors on every saved page and print the mean time per page.
+    :param pages_directory: directory holding saved video pages as .html files
+    :param repetitions: number of times each page is parsed per extractor
+    :return:
+    """
+    pages = [path.read_bytes() for path in sorted(Path(pages_directory).glob('*.html'))]
+    if len(pages) == 0:
+        raise Exception(f"No saved pages (*.html) found in {pages_directory}.")
+
+    for page in pages:
+        if extract_next_data_fast(page) != extract_next_data_soup(page):
+            raise Exception("Extractors return different __NEXT_DATA__ for the same page.")
+
+    fast = timeit.timeit(lambda: [extract_next_data_fast(page) for page in pages], number=repetitions)
+    soup = timeit.timeit(lambda: [extract_next_data_soup(page) for page in pages], number=repetitions)
+    number_of_parses = len(pages) * repetitions
+    print(f"{len(pages)} pages, {repetitions} repetitions, "
+          f"{sum(len(page) for page in pages) / len(pages) / 1024:.1f} KiB per page on average")
+    print(f"byte level extractor: {fast / number_of_parses * 1000:.3f} ms per page")
+    print(f"BeautifulSoup (lxml): {soup / number_of_parses * 1000:.3f} ms per page")
+    print(f"speed-up: {soup / fast:.1f}x")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python Testing/NextDataBenchmark.py <directory with saved video pages> [repetitions]")
+        sys.exit(1)
+    benchmark(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 20)
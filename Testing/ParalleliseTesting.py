@@ -1,12 +1,32 @@
-import concurrent.futures
+import os
+import sys
 
 from src.WebHelper import *
 from src.Proxy import *
 from src.DataStoring import *
+from src.ActionPlan import ActionPlan
+from src.BackgroundWriter import BackgroundWriter
+from src.Checkpoint import BatchCheckpoint, CheckpointedSession
+from src.DriverPool import DriverPool
+from src.RetryPolicy import RetryPolicy
+from src.SessionRecorder import SessionRecorder
+from src.SessionScheduler import SessionScheduler
+from src.Tracer import Tracer
 from src.TestRun import TestRun
 
 base_path = Path(__file__).parent
 
+# driver pool of the current worker process, prewarms the session of the worker's next test user
+driver_pool = None
+
+
+def get_driver_pool(logger, base_url=None, headless=False):
+    global driver_pool
+    if driver_pool is None:
+        driver_pool = DriverPool(logger=logger, base_url=base_url or "https://tiktok.com/", headless=bool(headless))
+    return driver_pool
+
+
 def get_test_data():
     database = DatabaseHelper()
     file_path = (base_path / "../Testing/TestSets/test_user_167.json").resolve()
@@ -57,7 +77,7 @@ def get_test_data():
 
 
 # main function initializing all different steps within one test iteration
-def run_test(test_data):
+def run_test(test_data, next_test_data=None):
     # setting start time
     start = time.time()
 
@@ -69,84 +89,195 @@ def run_test(test_data):
     logger.setLevel(logging.WARNING)
     logger.warning(f'Starting execution for testuser {test_data.get("test_user_id")}.')
 
-    # initializing DatabaseHelper() object only once for test run
-    database = DatabaseHelper()
+    # initializing span trace of the test user
+    tracer = Tracer(file_path=(base_path / f"../traces/trace_{test_data.get('test_run_id')}_user_"
+                                           f"{test_data.get('test_user_id')}.jsonl").resolve(),
+                    test_user_id=test_data.get('test_user_id'), test_run_id=test_data.get('test_run_id'))
 
-    # initializing helper instance
-    helper = WebHelper(test_user_id=test_data.get('test_user_id'),
-                       test_run_id=test_data.get('test_run_id'),
-                       logger=logger,
-                       database=database,
-                       phone_number=test_data.get('phone_number'),
-                       country_phone_number_prefix=test_data.get('country_phone_number_prefix'),
-                       reuse_cookies=test_data.get('reuse_cookies'),
-                       proxy=test_data.get('proxy'),
-                       browser_language=test_data.get("browser_language"))
-
-    # triggering login for user via phone number only if "login" set true in test_data
-    if test_data.get('login'):
-        helper.login_user_phone()
-        helper.handle_banners()
+    # resources of the session, released in any case once the session ended
+    helper = None
+    recorder = None
+    checkpoint = None
+    writer = None
+    try:
+        # retry policy shared by all retrying call sites, e.g. {"max_attempts": 5, "deadline": 120} in the test set
+        retry_policy = RetryPolicy(**(test_data.get('retry_policy') or {}))
+
+        # initializing DatabaseHelper() object only once for test run
+        database = DatabaseHelper(retry_policy=retry_policy)
+
+        # define number of batches to scroll through
+        if len(test_data.get('number_of_posts_to_like_per_batch')) != 0 \
+                or len(test_data.get('number_of_creators_to_follow_per_batch')) != 0 \
+                or len(test_data.get('number_of_posts_to_watch_longer_per_batch')):
+            if test_data.get('number_of_batches') != max(
+                    len(test_data.get('number_of_posts_to_like_per_batch')),
+                    len(test_data.get('number_of_creators_to_follow_per_batch')),
+                    len(test_data.get('number_of_posts_to_watch_longer_per_batch'))):
+                raise Exception("Number of batches to scroll through doesn't match!")
+            else:
+                number_of_batches = test_data.get('number_of_batches')
+        else:
+            number_of_batches = test_data.get('number_of_batches')
 
-    # trigger handling of banners
-    helper.handle_banners()
+        # checkpointing the run after every batch if "checkpoint" set true, a checkpoint left by a previous session of
+        # the same test run that died is continued
+        if test_data.get('checkpoint'):
+            checkpoint = BatchCheckpoint(
+                file_path=(base_path / f"../DataAnalysis/checkpoints/checkpoint_{test_data.get('test_run_id')}_user_"
+                                       f"{test_data.get('test_user_id')}.jsonl").resolve(),
+                test_user_id=test_data.get('test_user_id'), test_run_id=test_data.get('test_run_id'),
+                number_of_batches=number_of_batches)
 
-    # pause video until actually watching
-    helper.pause_video()
+        # a previous session that checkpointed every batch but died before storing the run leaves nothing to scroll
+        if checkpoint is not None and checkpoint.is_fully_checkpointed():
+            return store_checkpointed_run(test_data, logger, database, checkpoint, start)
 
-    # pause first video
-    if test_data.get('collecting_data_for_first_posts'):
+        # initializing helper instance
+        helper = WebHelper(test_user_id=test_data.get('test_user_id'),
+                           test_run_id=test_data.get('test_run_id'),
+                           logger=logger,
+                           database=database,
+                           phone_number=test_data.get('phone_number'),
+                           country_phone_number_prefix=test_data.get('country_phone_number_prefix'),
+                           reuse_cookies=test_data.get('reuse_cookies'),
+                           proxy=test_data.get('proxy'),
+                           browser_language=test_data.get("browser_language"),
+                           streaming_capture=test_data.get("streaming_capture"),
+                           capture_scope=test_data.get("capture_scope"),
+                           driver_pool=get_driver_pool(logger, base_url=test_data.get("base_url"),
+                                                       headless=test_data.get("headless")),
+                           page_load_strategy=test_data.get("page_load_strategy"),
+                           block_media=test_data.get("block_media"),
+                           tracer=tracer,
+                           retry_policy=retry_policy,
+                           base_url=test_data.get("base_url"),
+                           headless=test_data.get("headless"))
+
+        # launch and validate the session of the next test user of this worker while the current one is scrolling
+        if next_test_data is not None:
+            get_driver_pool(logger).prewarm(proxy=next_test_data.get('proxy'),
+                                            browser_language=next_test_data.get('browser_language'),
+                                            streaming_capture=next_test_data.get('streaming_capture'),
+                                            capture_scope=next_test_data.get('capture_scope'),
+                                            page_load_strategy=next_test_data.get('page_load_strategy'),
+                                            block_media=next_test_data.get('block_media'))
+
+        # triggering login for user via phone number only if "login" set true in test_data
+        if test_data.get('login'):
+            helper.login_user_phone()
+            helper.handle_banners()
+
+        # trigger handling of banners
         helper.handle_banners()
+
+        # pause video until actually watching
         helper.pause_video()
 
-    # set cookies if applicable
-    if test_data.get('reuse_cookies'):
-        helper.set_cookies()
-
-    # define number of batches to scroll through
-    if len(test_data.get('number_of_posts_to_like_per_batch')) != 0 \
-            or len(test_data.get('number_of_creators_to_follow_per_batch')) != 0 \
-            or len(test_data.get('number_of_posts_to_watch_longer_per_batch')):
-        if test_data.get('number_of_batches') != max(len(test_data.get('number_of_posts_to_like_per_batch')),
-                                                     len(test_data.get('number_of_creators_to_follow_per_batch')),
-                                                     len(test_data.get('number_of_posts_to_watch_longer_per_batch'))):
-            raise Exception("Number of batches to scroll through doesn't match!")
-        else:
-            number_of_batches = test_data.get('number_of_batches')
-    else:
-        number_of_batches = test_data.get('number_of_batches')
+        # pause first video
+        if test_data.get('collecting_data_for_first_posts'):
+            helper.handle_banners()
+            helper.pause_video()
+
+        # set cookies if applicable
+        if test_data.get('reuse_cookies'):
+            helper.set_cookies()
+
+        # archiving consumed item lists and video pages for replaying the run offline if "record_session" set true
+        if test_data.get('record_session'):
+            recorder = SessionRecorder(
+                file_path=(base_path / f"../DataAnalysis/recordings/session_{test_data.get('test_run_id')}_user_"
+                                       f"{test_data.get('test_user_id')}.jsonl.gz").resolve(),
+                test_user_id=test_data.get('test_user_id'), test_run_id=test_data.get('test_run_id'))
+
+        # storing posts of completed batches while scrolling if "background_writer" set true, the writer needs its own
+        # database connection
+        if test_data.get('background_writer'):
+            writer = BackgroundWriter(database=DatabaseHelper(retry_policy=retry_policy), logger=logger,
+                                      test_user_id=test_data.get('test_user_id'),
+                                      test_run_id=test_data.get('test_run_id'))
 
-    # initializing data storing instance
-    data_storing = DataStoring(helper=helper,
+        # initializing data storing instance
+        data_storing = DataStoring(helper=helper,
+                                   logger=logger,
+                                   database=database,
+                                   number_of_batches=number_of_batches,
+                                   test_user_id=test_data.get('test_user_id'),
+                                   test_run_id=test_data.get('test_run_id'),
+                                   recorder=recorder,
+                                   checkpoint=checkpoint,
+                                   writer=writer)
+        if checkpoint is not None and checkpoint.can_resume():
+            checkpoint.restore(data_storing)
+            logger.warning(f'Continuing run of testuser {test_data.get("test_user_id")} from checkpoint with batch '
+                           f'{data_storing.first_batch}.')
+        elif writer is not None and (test_data.get('attempt', 1) > 1 or
+                                     (checkpoint is not None and checkpoint.has_previous_session())):
+            # an earlier attempt of the test user may have stored posts in background, the run starts from scratch
+            database.delete_test_user_data(test_user_id=test_data.get('test_user_id'),
+                                           test_run_id=test_data.get('test_run_id'))
+
+        # trigger handling of banners
+        helper.handle_banners()
+
+        # handling first set of posts
+        data_storing.get_separate_posts_data(
+            collecting_data_for_first_posts=test_data.get("collecting_data_for_first_posts"),
+            fetch_over_http=test_data.get("fetch_separate_posts_over_http"))
+
+        # handling remaining posts, scrolling through batches
+        data_storing.get_request_posts_data(time_to_look_at_post_action=test_data.get('time_to_look_at_post_action'),
+                                            time_to_look_at_post_normal=test_data.get('time_to_look_at_post_normal'),
+                                            action_plan=ActionPlan.compile(test_data))
+
+        if helper.block_media:
+            logger.warning(f'Media requests blocked for testuser {test_data.get("test_user_id")}: '
+                           f'{helper.request_capture.blocked_media_requests}.')
+
+        # commencing shut down of test run: unflagging used proxy, closing driver, storing collected data, computing
+        # duration and storing it for corresponding testrun
+        helper.close_driver()
+        if test_data.get('proxy') is not None:
+            helper.database.unflag_proxy(proxy_host=test_data['proxy']['proxy_host'],
+                                         proxy_port=test_data['proxy']['proxy_port'])
+        data_storing.store_collected_data()
+        if checkpoint is not None:
+            checkpoint.record_completed()
+    except Exception:
+        shut_down_failed_session(test_data, logger, helper, writer)
+        raise
+    finally:
+        for resource in (checkpoint, recorder, tracer):
+            if resource is not None:
+                resource.close()
+    duration = time.time() - start
+    test_data['duration'] = (duration / 60)
+    test_data['wait_budget'] = helper.wait_budget.report()
+    test_data['mobile_dom_rejections'] = helper.mobile_dom_rejections.report()
+    test_data['posts_seen'] = len(helper.post_batch_positions)
+    test_data['bandwidth'] = helper.bandwidth_meter.report()
+    logger.warning(f'Bytes transferred for testuser {test_data.get("test_user_id")}: {test_data["bandwidth"]}.')
+    logger.warning(f'Time spent waiting for testuser {test_data.get("test_user_id")}: {test_data["wait_budget"]}.')
+    logger.warning(f'Execution for testuser {test_data.get("test_user_id")} completed in {duration} seconds '
+                   f'({duration / 60} minutes).')
+    return test_data
+
+
+# store a run whose previous session checkpointed all of its batches, no browser is launched
+def store_checkpointed_run(test_data, logger, database, checkpoint, start):
+    logger.warning(f'All batches of testuser {test_data.get("test_user_id")} were checkpointed, storing the run.')
+    session = CheckpointedSession(file_path=checkpoint.file_path, logger=logger)
+    data_storing = DataStoring(helper=session,
                                logger=logger,
                                database=database,
-                               number_of_batches=number_of_batches,
+                               number_of_batches=0,
                                test_user_id=test_data.get('test_user_id'),
                                test_run_id=test_data.get('test_run_id'))
-
-    # trigger handling of banners
-    helper.handle_banners()
-
-    # handling first set of posts
-    data_storing.get_separate_posts_data(collecting_data_for_first_posts=test_data.get("collecting_data_for_first_posts"))
-
-    # handling remaining posts, scrolling through batches
-    data_storing.get_request_posts_data(time_to_look_at_post_action=test_data.get('time_to_look_at_post_action'),
-                                        time_to_look_at_post_normal=test_data.get('time_to_look_at_post_normal'),
-                                        number_of_posts_to_like_per_batch=test_data.get('number_of_posts_to_like_per_batch'),
-                                        number_of_creators_to_follow_per_batch=test_data.get('number_of_creators_to_follow_per_batch'),
-                                        number_of_posts_to_watch_longer_per_batch=test_data.get('number_of_posts_to_watch_longer_per_batch'),
-                                        posts_with_hashtag_to_like=test_data.get('posts_with_hashtag_to_like'),
-                                        posts_with_hashtag_to_watch_longer=test_data.get('posts_with_hashtag_to_watch_longer'),
-                                        posts_of_content_creators_to_like=test_data.get('posts_of_content_creators_to_like'),
-                                        posts_of_music_ids_to_like=test_data.get('posts_of_music_ids_to_like'))
-
-    # commencing shut down of test run: unflagging used proxy, closing driver, storing collected data, computing
-    # duration and storing it for corresponding testrun
-    helper.close_driver()
-    helper.database.unflag_proxy(proxy_host=test_data['proxy']['proxy_host'],
-                                 proxy_port=test_data['proxy']['proxy_port'])
-    data_storing.store_collected_data()
+    session.store(data_storing)
+    checkpoint.record_completed()
+    if test_data.get('proxy') is not None:
+        database.unflag_proxy(proxy_host=test_data['proxy']['proxy_host'],
+                              proxy_port=test_data['proxy']['proxy_port'])
     duration = time.time() - start
     test_data['duration'] = (duration / 60)
     logger.warning(f'Execution for testuser {test_data.get("test_user_id")} completed in {duration} seconds '
@@ -154,23 +285,77 @@ def run_test(test_data):
     return test_data
 
 
+# release the driver, the proxy and the background writer of a session that failed, such that the next attempt of the
+# test user starts clean; errors while shutting down are only logged, the error of the session is the one raised
+def shut_down_failed_session(test_data, logger, helper, writer):
+    logger.warning(f'Execution for testuser {test_data.get("test_user_id")} failed, shutting down the session.')
+    if writer is not None:
+        try:
+            writer.close()
+        except Exception as err:
+            logger.warning(f"Background writer of testuser {test_data.get('test_user_id')} could not be closed: {err}")
+    if helper is None:
+        return
+    try:
+        helper.close_driver()
+    except Exception as err:
+        logger.warning(f"Driver of testuser {test_data.get('test_user_id')} could not be closed: {err}")
+        if helper.driver is not None:
+            try:
+                helper.driver.quit()
+            except Exception:
+                pass
+            helper.driver = None
+    if test_data.get('proxy') is not None:
+        try:
+            helper.database.unflag_proxy(proxy_host=test_data['proxy']['proxy_host'],
+                                         proxy_port=test_data['proxy']['proxy_port'])
+        except Exception as err:
+            logger.warning(f"Proxy of testuser {test_data.get('test_user_id')} could not be unflagged: {err}")
+
+
+# close the driver pool of a worker process before the process stops
+def close_driver_pool():
+    if driver_pool is not None:
+        driver_pool.logger.warning(f"Sessions with mobile DOM rejected by driver pool: "
+                                   f"{driver_pool.mobile_dom_rejections.report()}")
+        driver_pool.close()
+
+
+# usage: python Testing/ParalleliseTesting.py [number of concurrent sessions] [attempts per test user]
+#        [sessions per proxy country] [sessions per proxy host] [seconds between session launches]
+# limits per proxy country and host are not applied if 0
 if __name__ == '__main__':
     tests = get_test_data()
+    number_of_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else min(len(tests), os.cpu_count() or 1)
+    max_attempts = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    max_sessions_per_country = int(sys.argv[3]) if len(sys.argv) > 3 and int(sys.argv[3]) > 0 else None
+    max_sessions_per_host = int(sys.argv[4]) if len(sys.argv) > 4 and int(sys.argv[4]) > 0 else None
+    launch_stagger = float(sys.argv[5]) if len(sys.argv) > 5 else 0
 
     # crete test run object with given test data and run tests in parallel
     with TestRun(test_data=tests) as test_run:
         for test in tests:
             test['test_run_id'] = test_run.test_run_id
-        with concurrent.futures.ProcessPoolExecutor() as executor:
-            test_data_results = executor.map(run_test, tests)
         test_user_ids = []
         batch_size = 0
 
-        # obtain test results and store them accordingly
-        for test in test_data_results:
-            test_run.store_test_duration(duration=test.get('duration'), test_user_id=test.get('test_user_id'))
+        # store the results of a test user as soon as its session finished
+        def store_test_results(test):
+            global batch_size
+            test_run.store_test_duration(duration=test.get('duration'), test_user_id=test.get('test_user_id'),
+                                         bandwidth=test.get('bandwidth'))
             test_user_ids.append(test.get('test_user_id'))
             batch_size = test.get('number_of_batches')
+
+        scheduler = SessionScheduler(run_session=run_test, number_of_sessions=number_of_sessions,
+                                     max_attempts=max_attempts, on_worker_exit=close_driver_pool,
+                                     max_sessions_per_country=max_sessions_per_country,
+                                     max_sessions_per_host=max_sessions_per_host, launch_stagger=launch_stagger)
+        test_data_results = scheduler.run(tests, on_result=store_test_results)
+        if len(scheduler.failed) > 0:
+            print(f"Test users without results in test run {test_run.test_run_id}: "
+                  f"{[test.get('test_user_id') for test in scheduler.failed]}")
         # update analysis table
         # update_overlapping_post_test_results_with_new_values(test_run=test_run.test_run_id, test_users=test_user_ids,
         #                                                      batch_size=batch_size)
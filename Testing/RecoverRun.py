@@ -0,0 +1,84 @@
+# recovery of a run whose session died, from the checkpoint written after every batch (test set key "checkpoint"):
+# "store" stores the posts and actions as far as they were checkpointed, "continue" runs the remaining batches of the
+# test user in a fresh session of the same test run and stores the entire run at its end
+# usage: python Testing/RecoverRun.py <store|continue> <checkpoint (.jsonl)>
+
+import logging
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.Checkpoint import BatchCheckpoint, CheckpointedSession, read_checkpoint
+from src.DataStoring import DataStoring
+from src.DatabaseHelper import DatabaseHelper
+
+
+def store(checkpoint_path):
+    """
+    Store a partial run as far as it was checkpointed.
+    :param checkpoint_path:
+    :return:
+    """
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger()
+    session = CheckpointedSession(file_path=checkpoint_path, logger=logger)
+    if session.completed:
+        print(f"Run of test user {session.test_user_id} in test run {session.test_run_id} was already completed.")
+        return
+    data_storing = DataStoring(helper=session,
+                               logger=logger,
+                               database=DatabaseHelper(),
+                               number_of_batches=0,
+                               test_user_id=session.test_user_id,
+                               test_run_id=session.test_run_id)
+    session.store(data_storing)
+    checkpoint = BatchCheckpoint(file_path=checkpoint_path, test_user_id=session.test_user_id,
+                                 test_run_id=session.test_run_id, number_of_batches=None)
+    checkpoint.record_completed()
+    checkpoint.close()
+    print(f"{len(session.posts)} posts of test user {session.test_user_id} in test run {session.test_run_id} stored "
+          f"up to batch {session.batch}.")
+
+
+def continue_run(checkpoint_path):
+    """
+    Continue a partial run in a fresh session with the test set of its test user.
+    :param checkpoint_path:
+    :return:
+    """
+    # imported here as ParalleliseTesting imports the whole selenium stack
+    from Testing import ParalleliseTesting
+
+    state = read_checkpoint(checkpoint_path)
+    if state.get('completed'):
+        print(f"Run of test user {state.get('test_user_id')} in test run {state.get('test_run_id')} was already "
+              f"completed.")
+        return
+    # run_test continues the checkpoint at the path of the test run and test user
+    expected_path = (ParalleliseTesting.base_path / f"../DataAnalysis/checkpoints/checkpoint_{state.get('test_run_id')}"
+                                                    f"_user_{state.get('test_user_id')}.jsonl").resolve()
+    if Path(checkpoint_path).resolve() != expected_path:
+        raise Exception(f"Checkpoint {checkpoint_path} must be in DataAnalysis/checkpoints to be continued.")
+    test_data = next((test for test in ParalleliseTesting.get_test_data()
+                      if test.get('test_user_id') == state.get('test_user_id')), None)
+    if test_data is None:
+        raise Exception(f"No test set for test user {state.get('test_user_id')}.")
+    test_data['test_run_id'] = state.get('test_run_id')
+    test_data['checkpoint'] = True
+    try:
+        result = ParalleliseTesting.run_test(test_data)
+    finally:
+        ParalleliseTesting.close_driver_pool()
+    print(f"Run of test user {result.get('test_user_id')} in test run {result.get('test_run_id')} continued after "
+          f"batch {state.get('batch')} and completed in {result.get('duration'):.1f} minutes.")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('store', 'continue'):
+        print("usage: python Testing/RecoverRun.py <store|continue> <checkpoint (.jsonl)>")
+        sys.exit(1)
+    if sys.argv[1] == 'store':
+        store(sys.argv[2])
+    else:
+        continue_run(sys.argv[2])
@@ -0,0 +1,49 @@
+# replay of a session archive written by src/SessionRecorder.py through DataStoring and DatabaseHelper.store_data,
+# without browser or network apart from the database, e.g. to benchmark and profile the ingest path on real data
+# usage: python Testing/ReplaySession.py <session archive (.jsonl.gz)> [test run id to store the data for]
+
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.DataStoring import DataStoring
+from src.DatabaseHelper import DatabaseHelper
+from src.SessionRecorder import SessionReplay
+from src.Tracer import Tracer
+
+base_path = Path(__file__).parent
+
+
+def replay(archive_path, test_run_id=None):
+    """
+    Ingest a recorded session and print the time spent.
+    :param archive_path: session archive
+    :param test_run_id: test run the data is stored for, the recorded test run if None
+    :return:
+    """
+    logging.basicConfig(level=logging.ERROR)
+    logger = logging.getLogger()
+    start = time.time()
+    tracer = Tracer(file_path=(base_path / f"../traces/replay_{Path(archive_path).name}.jsonl").resolve())
+    session = SessionReplay(file_path=archive_path, logger=logger, tracer=tracer)
+    loaded = time.time()
+    data_storing = DataStoring(helper=session,
+                               logger=logger,
+                               database=DatabaseHelper(),
+                               number_of_batches=0,
+                               test_user_id=session.test_user_id,
+                               test_run_id=test_run_id if test_run_id is not None else session.test_run_id)
+    session.replay(data_storing)
+    tracer.close()
+    print(f"{len(data_storing.temp_data_collection)} posts of test user {session.test_user_id} replayed: "
+          f"{loaded - start:.2f}s reading the archive, {time.time() - loaded:.2f}s ingesting")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python Testing/ReplaySession.py <session archive (.jsonl.gz)> [test run id]")
+        sys.exit(1)
+    replay(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
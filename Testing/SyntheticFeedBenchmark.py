@@ -0,0 +1,95 @@
+# end-to-end benchmark of run_test against the synthetic feed of Testing/SyntheticFeedServer.py in headless Chrome:
+# no proxy, no TikTok, thus the numbers only depend on the bot itself, e.g. to compare posts per minute and memory
+# before and after a change; test user and test run must exist in the database as the collected data is stored
+# usage: python Testing/SyntheticFeedBenchmark.py <test user id> <test run id> [number of batches] [port]
+
+import json
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from Testing import ParalleliseTesting
+from Testing.SyntheticFeedServer import start_in_background
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak memory is not reported there
+    resource = None
+
+
+def peak_memory_mb():
+    """
+    :return: peak resident memory in MB of this process and of its terminated children (chromedriver and Chrome once
+    the driver is closed), None if not available
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit}
+
+
+def benchmark(test_user_id, test_run_id, number_of_batches=5, port=5000):
+    """
+    Run one headless session of a test user against the synthetic feed and print the throughput.
+    :param test_user_id:
+    :param test_run_id:
+    :param number_of_batches:
+    :param port: port of the synthetic feed server
+    :return: test data returned by run_test
+    """
+    base_url = f"http://127.0.0.1:{port}/"
+    server = start_in_background(port=port)
+    test_data = {
+        'test_user_id': test_user_id,
+        'test_run_id': test_run_id,
+        'base_url': base_url,
+        'headless': True,
+        'proxy': None,
+        'login': False,
+        'browser_language': 'en',
+        'reuse_cookies': False,
+        'time_to_look_at_post_action': 0,
+        'time_to_look_at_post_normal': 0.1,
+        'number_of_batches': number_of_batches,
+        'number_of_posts_to_like_per_batch': [],
+        'number_of_creators_to_follow_per_batch': [],
+        'number_of_posts_to_watch_longer_per_batch': [],
+        'posts_with_hashtag_to_watch_longer': [],
+        'posts_with_hashtag_to_like': [],
+        'posts_of_content_creators_to_like': [],
+        'posts_of_music_ids_to_like': [],
+        'collecting_data_for_first_posts': False,
+    }
+    try:
+        result = ParalleliseTesting.run_test(test_data)
+    finally:
+        if ParalleliseTesting.driver_pool is not None:
+            ParalleliseTesting.driver_pool.close()
+    with urllib.request.urlopen(base_url + "stats") as response:
+        served = json.loads(response.read())
+    server.shutdown()
+
+    minutes = result.get('duration')
+    print(f"{result.get('posts_seen')} posts seen in {minutes * 60:.1f}s: "
+          f"{result.get('posts_seen') / minutes:.1f} posts per minute")
+    print(f"peak memory in MB: {peak_memory_mb()}")
+    print(f"served by synthetic feed: {served}")
+    print(f"time spent waiting: {result.get('wait_budget')}")
+    return result
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("usage: python Testing/SyntheticFeedBenchmark.py <test user id> <test run id> [number of batches] [port]")
+        sys.exit(1)
+    start = time.time()
+    benchmark(test_user_id=int(sys.argv[1]), test_run_id=int(sys.argv[2]),
+              number_of_batches=int(sys.argv[3]) if len(sys.argv) > 3 else 5,
+              port=int(sys.argv[4]) if len(sys.argv) > 4 else 5000)
+    print(f"benchmark completed in {time.time() - start:.1f}s")
@@ -0,0 +1,285 @@
+# local stand-in for TikTok's desktop ForYou feed to benchmark the bot end-to-end in headless Chrome without touching
+# TikTok or proxies: the feed DOM matches the XPaths used by WebHelper (lazyload-wrapper, tt-feed, like and follow
+# buttons, loading container), posts are loaded page by page through api/recommend/item_list and every post has a video
+# page carrying __NEXT_DATA__
+# usage: python Testing/SyntheticFeedServer.py [port] [page size] [item_list delay in seconds]
+
+import json
+import random
+import sys
+import threading
+import time
+
+from flask import Flask, Response, abort, jsonify, request
+from werkzeug.serving import make_server
+
+# offset of the synthetic post, author and music ids, post ids are offset + position of the post in the feed
+POST_ID_OFFSET = 7000000000000000000
+AUTHOR_ID_OFFSET = 6800000000000000000
+MUSIC_ID_OFFSET = 6900000000000000000
+HASHTAGS = ['fyp', 'foryou', 'viral', 'funny', 'dance', 'music', 'food', 'travel', 'sports', 'pets', 'art', 'diy',
+            'fashion', 'gaming', 'science', 'comedy', 'fitness', 'beauty', 'nature', 'cars']
+
+FEED_PAGE = """<!DOCTYPE html>
+<html pc="yes" lang="en">
+<head>
+<meta charset="utf-8">
+<title>Synthetic feed</title>
+<style>
+body { margin: 0; font-family: sans-serif; }
+.lazyload-wrapper { display: block; height: 95vh; border-bottom: 1px solid #ddd; }
+.video-card { width: 300px; height: 60vh; background: #161823; }
+.video-card-inner, .video-player, video { width: 100%; height: 100%; }
+.action-bar > div, .item-follow-wrapper { display: inline-block; margin-right: 16px; cursor: pointer; }
+.tiktok-ui-loading-container { position: fixed; top: 0; left: 0; right: 0; height: 40px; background: #fe2c55; }
+</style>
+</head>
+<body>
+<div id="main">
+<div class="tt-feed"></div>
+<div class="tiktok-ui-loading-container tiktok-loading" style="display: none"></div>
+</div>
+<script>
+var initialPosts = __INITIAL_POSTS__;
+var feed = document.querySelector('.tt-feed');
+var loader = document.querySelector('.tiktok-ui-loading-container');
+var video = document.createElement('video');
+var cursor = __CURSOR__;
+var hasMore = true;
+var loading = false;
+var activeIndex = -1;
+
+function element(tag, attributes, children) {
+    var node = document.createElement(tag);
+    Object.keys(attributes || {}).forEach(function (name) { node.setAttribute(name, attributes[name]); });
+    (children || []).forEach(function (child) {
+        node.appendChild(typeof child === 'string' ? document.createTextNode(child) : child);
+    });
+    return node;
+}
+
+function svg(paths, fill) {
+    var node = document.createElementNS('http://www.w3.org/2000/svg', 'svg');
+    if (fill) { node.setAttribute('fill', fill); }
+    for (var i = 0; i < paths; i++) {
+        node.appendChild(document.createElementNS('http://www.w3.org/2000/svg', 'path'));
+    }
+    return node;
+}
+
+function renderPost(post) {
+    var href = location.origin + '/@' + post.author.uniqueId + '/video/' + post.id;
+    var hashtags = post.textExtra.map(function (tag) {
+        return element('a', {href: location.origin + '/tag/' + tag.hashtagName + '?lang=en'},
+                       [element('strong', {}, ['#' + tag.hashtagName])]);
+    });
+    var musicHref = location.origin + '/music/original-sound-' + post.music.id + '?lang=en';
+    return element('span', {'class': 'lazyload-wrapper'}, [
+        element('div', {'class': 'feed-item-content'}, [
+            element('div', {'class': 'item-content'}, [
+                element('div', {'class': 'author-info'}, [
+                    element('h3', {'class': 'author-uniqueId'}, [post.author.uniqueId]),
+                    element('h4', {'class': 'author-nickname'}, [post.author.nickname]),
+                    element('div', {'class': 'tt-video-music'}, [
+                        element('h4', {}, [element('a', {href: musicHref}, [post.music.title])])])]),
+                element('div', {'class': 'tt-video-meta-caption'}, [element('span', {}, [post.desc])]
+                        .concat(hashtags)),
+                element('div', {'class': 'video-card-container'}, [
+                    element('div', {'class': 'video-card'}, [
+                        element('a', {href: href, 'class': 'video-link'}, [
+                            element('div', {'class': 'video-card-inner'}, [
+                                element('div', {'class': 'video-player'}),
+                                element('div', {'class': 'toggle-icon-v4'}, [svg(1)])])])]),
+                    element('div', {'class': 'action-bar'}, [
+                        element('div', {'class': 'like-action'}, [
+                            element('div', {'class': 'icon'}, [svg(1, 'rgba(22, 24, 35, 1)')]),
+                            element('strong', {title: 'like'}, [String(post.stats.diggCount)])]),
+                        element('div', {'class': 'comment-action'}, [
+                            element('div', {'class': 'icon'}, [svg(1, 'rgba(22, 24, 35, 1)')]),
+                            element('strong', {title: 'comment'}, [String(post.stats.commentCount)])])])]),
+                element('div', {'class': 'item-follow-wrapper'}, [
+                    element('button', {'class': 'follow-button'}, ['Follow'])])])])]);
+}
+
+function setPlaying(wrapper, playing) {
+    var toggle = wrapper.querySelector('.toggle-icon-v4');
+    toggle.replaceChild(svg(playing ? 2 : 1), toggle.firstChild);
+}
+
+function activate(index) {
+    var wrappers = document.querySelectorAll('.lazyload-wrapper');
+    if (index === activeIndex || index >= wrappers.length) { return; }
+    if (activeIndex >= 0 && activeIndex < wrappers.length) { setPlaying(wrappers[activeIndex], false); }
+    activeIndex = index;
+    wrappers[index].querySelector('.video-player').appendChild(video);
+    setPlaying(wrappers[index], true);
+    if (index >= wrappers.length - 2) { loadMore(); }
+}
+
+function loadMore() {
+    if (loading || !hasMore) { return; }
+    loading = true;
+    loader.style.display = 'block';
+    fetch('/api/recommend/item_list/?aid=1988&app_name=tiktok_web&device_platform=web_pc&count=30&cursor=' + cursor)
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+            data.itemList.forEach(function (post) { feed.appendChild(renderPost(post)); });
+            cursor = data.cursor;
+            hasMore = data.hasMore;
+        })
+        .finally(function () {
+            loading = false;
+            loader.style.display = 'none';
+        });
+}
+
+function activeWrapperIndex() {
+    var wrappers = document.querySelectorAll('.lazyload-wrapper');
+    var closest = 0;
+    for (var i = 0; i < wrappers.length; i++) {
+        if (Math.abs(wrappers[i].getBoundingClientRect().top) <
+            Math.abs(wrappers[closest].getBoundingClientRect().top)) { closest = i; }
+    }
+    return closest;
+}
+
+document.addEventListener('scroll', function () { activate(activeWrapperIndex()); }, true);
+
+document.addEventListener('click', function (event) {
+    var target = event.target;
+    var link = target.closest('a.video-link');
+    if (link) { event.preventDefault(); }
+    var toggle = target.closest('.toggle-icon-v4');
+    if (toggle) { setPlaying(toggle.closest('.lazyload-wrapper'), toggle.querySelectorAll('path').length === 1); }
+    var like = target.closest('.like-action');
+    if (like) {
+        var icon = like.querySelector('svg');
+        icon.setAttribute('fill', icon.getAttribute('fill') === 'none' ? 'rgba(22, 24, 35, 1)' : 'none');
+    }
+    var follow = target.closest('.follow-button');
+    if (follow) { follow.textContent = follow.textContent === 'Follow' ? 'Following' : 'Follow'; }
+}, true);
+
+initialPosts.forEach(function (post) { feed.appendChild(renderPost(post)); });
+activate(0);
+loadMore();
+</script>
+</body>
+</html>
+"""
+
+VIDEO_PAGE = """<!DOCTYPE html>
+<html pc="yes" lang="en">
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<div id="main"><video></video></div>
+<script id="__NEXT_DATA__" type="application/json" crossorigin="anonymous">{next_data}</script>
+</body>
+</html>
+"""
+
+
+def generate_post(position, seed=0):
+    """
+    Deterministic post data in the structure of api/recommend/item_list (itemStruct) for a position in the feed.
+    :param position: position of the post in the feed, starting at 0
+    :param seed: seed shared by all posts of a feed
+    :return: post data
+    """
+    rng = random.Random(seed * 1000003 + position)
+    author_number = rng.randrange(200)
+    music_number = rng.randrange(500)
+    hashtags = rng.sample(HASHTAGS, rng.randint(0, 4))
+    return {
+        'id': str(POST_ID_OFFSET + position),
+        'desc': f"Synthetic post {position} " + ' '.join('#' + hashtag for hashtag in hashtags),
+        'createTime': 1620000000 + position,
+        'isAd': False,
+        'video': {'id': str(POST_ID_OFFSET + position), 'duration': rng.randint(5, 60), 'height': 1024,
+                  'width': 576},
+        'author': {'id': str(AUTHOR_ID_OFFSET + author_number), 'uniqueId': f"creator{author_number}",
+                   'nickname': f"Creator {author_number}"},
+        'authorStats': {'followerCount': rng.randint(0, 10 ** 6), 'followingCount': rng.randint(0, 1000),
+                        'heart': rng.randint(0, 10 ** 7), 'heartCount': rng.randint(0, 10 ** 7),
+                        'videoCount': rng.randint(1, 1000), 'diggCount': rng.randint(0, 10 ** 4)},
+        'music': {'id': str(MUSIC_ID_OFFSET + music_number), 'title': f"original sound {music_number}",
+                  'duration': rng.randint(5, 60)},
+        'stats': {'diggCount': rng.randint(0, 10 ** 6), 'shareCount': rng.randint(0, 10 ** 4),
+                  'commentCount': rng.randint(0, 10 ** 4), 'playCount': rng.randint(0, 10 ** 7)},
+        'textExtra': [{'hashtagId': str(1000 + HASHTAGS.index(hashtag)), 'hashtagName': hashtag,
+                       'isCommerce': False, 'type': 1} for hashtag in hashtags],
+    }
+
+
+def create_app(page_size=10, first_posts=2, item_list_delay=0.0, seed=0):
+    """
+    Flask app serving the synthetic feed.
+    :param page_size: number of posts per api/recommend/item_list response
+    :param first_posts: number of posts rendered with the feed page that are not part of any item list, like the first
+    posts of TikTok's feed for which DataStoring opens the video pages
+    :param item_list_delay: seconds api/recommend/item_list takes to respond
+    :param seed:
+    :return: Flask app, the served counts are available at /stats
+    """
+    app = Flask(__name__)
+    stats = {'feed_pages': 0, 'item_lists': 0, 'posts_served': 0, 'video_pages': 0}
+    lock = threading.Lock()
+
+    def count(key, value=1):
+        with lock:
+            stats[key] += value
+
+    @app.route('/')
+    def feed_page():
+        count('feed_pages')
+        count('posts_served', first_posts)
+        initial_posts = [generate_post(position, seed) for position in range(first_posts)]
+        page = FEED_PAGE.replace('__INITIAL_POSTS__', json.dumps(initial_posts)) \
+            .replace('__CURSOR__', str(first_posts))
+        return Response(page, mimetype='text/html')
+
+    @app.route('/api/recommend/item_list/')
+    def item_list():
+        cursor = int(request.args.get('cursor', first_posts))
+        if item_list_delay > 0:
+            time.sleep(item_list_delay)
+        count('item_lists')
+        count('posts_served', page_size)
+        return jsonify({'statusCode': 0, 'hasMore': True, 'cursor': cursor + page_size,
+                        'itemList': [generate_post(position, seed) for position in range(cursor, cursor + page_size)]})
+
+    @app.route('/@<unique_id>/video/<post_id>')
+    def video_page(unique_id, post_id):
+        if not post_id.isdigit() or int(post_id) < POST_ID_OFFSET:
+            abort(404)
+        count('video_pages')
+        post = generate_post(int(post_id) - POST_ID_OFFSET, seed)
+        next_data = {'props': {'pageProps': {'itemInfo': {'itemStruct': post}}}, 'page': '/@[uniqueId]/video/[id]'}
+        # "</" must not end the script element early
+        return Response(VIDEO_PAGE.format(title=post.get('desc'), next_data=json.dumps(next_data).replace('</', '<\\/')),
+                        mimetype='text/html')
+
+    @app.route('/stats')
+    def served_stats():
+        with lock:
+            return jsonify(dict(stats))
+
+    return app
+
+
+def start_in_background(port=5000, **kwargs):
+    """
+    Serve the synthetic feed from a background thread of the current process.
+    :param port:
+    :param kwargs: arguments of create_app
+    :return: server, call server.shutdown() to stop it
+    """
+    server = make_server('127.0.0.1', port, create_app(**kwargs), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    create_app(page_size=int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+               item_list_delay=float(sys.argv[3]) if len(sys.argv) > 3 else 0.0) \
+        .run(host='127.0.0.1', port=int(sys.argv[1]) if len(sys.argv) > 1 else 5000, threaded=True)
@@ -0,0 +1,49 @@
+# summary of the span traces written by src/Tracer.py: number of calls, total time, p50, p95 and max per span
+# usage: python Testing/TraceSummary.py [trace files or directories, default traces]
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+base_path = Path(__file__).parent
+
+
+def read_spans(paths):
+    """
+    Read the durations of all spans in the given trace files, directories are searched for *.jsonl files.
+    :param paths:
+    :return: {span name: [seconds]}
+    """
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob('*.jsonl')) if path.is_dir() else [path])
+    if len(files) == 0:
+        raise Exception(f"No trace files (*.jsonl) found in {', '.join(map(str, paths))}.")
+
+    spans = {}
+    for file in files:
+        with open(file) as trace:
+            for line in trace:
+                if line.strip():
+                    span = json.loads(line)
+                    spans.setdefault(span.get('name'), []).append(span.get('seconds'))
+    return spans
+
+
+def summarise(paths):
+    """
+    Print one row per span, sorted by total time spent with the largest first.
+    :param paths: trace files or directories holding trace files
+    :return:
+    """
+    spans = read_spans(paths)
+    print(f"{'span':<28}{'calls':>8}{'total s':>12}{'p50 s':>10}{'p95 s':>10}{'max s':>10}")
+    for name, seconds in sorted(spans.items(), key=lambda item: sum(item[1]), reverse=True):
+        print(f"{name:<28}{len(seconds):>8}{sum(seconds):>12.2f}{np.percentile(seconds, 50):>10.3f}"
+              f"{np.percentile(seconds, 95):>10.3f}{max(seconds):>10.3f}")
+
+
+if __name__ == '__main__':
+    summarise(sys.argv[1:] if len(sys.argv) > 1 else [(base_path / "../traces").resolve()])
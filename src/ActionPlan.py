@@ -0,0 +1,54 @@
+from collections import namedtuple
+
+ActionPlanFields = namedtuple("ActionPlanFields", field_names=(
+    "hashtags_to_like", "hashtags_to_watch_longer", "content_creators_to_like", "music_ids_to_like",
+    "posts_to_like_per_batch", "creators_to_follow_per_batch", "posts_to_watch_longer_per_batch"))
+
+
+def get_count_of_batch(counts_per_batch, batch):
+    """
+    :param counts_per_batch: tuple of counts per batch
+    :param batch:
+    :return: count of the batch, 0 for batches beyond the tuple
+    """
+    return counts_per_batch[batch] if batch < len(counts_per_batch) else 0
+
+
+class ActionPlan(ActionPlanFields):
+    """
+    Immutable plan of the actions of a test user, compiled once per run from the test set. Targets are frozensets such
+    that deciding on an action for a post is a set probe; the numbers of posts to like, creators to follow and posts to
+    watch longer are looked up per batch. Which posts of a batch are picked at random can only be drawn once the batch
+    and its number of posts are known, see WebHelper.select_random_selection.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def compile(cls, test_data):
+        """
+        :param test_data: test set of the test user
+        :return: ActionPlan
+        """
+        return cls(
+            hashtags_to_like=frozenset(test_data.get('posts_with_hashtag_to_like') or ()),
+            hashtags_to_watch_longer=frozenset(test_data.get('posts_with_hashtag_to_watch_longer') or ()),
+            content_creators_to_like=frozenset(test_data.get('posts_of_content_creators_to_like') or ()),
+            # music ids are read as strings from the captured posts and the DOM
+            music_ids_to_like=frozenset(str(music_id) for music_id in
+                                        test_data.get('posts_of_music_ids_to_like') or ()),
+            posts_to_like_per_batch=tuple(test_data.get('number_of_posts_to_like_per_batch') or ()),
+            creators_to_follow_per_batch=tuple(test_data.get('number_of_creators_to_follow_per_batch') or ()),
+            posts_to_watch_longer_per_batch=tuple(test_data.get('number_of_posts_to_watch_longer_per_batch') or ()))
+
+    def posts_to_like(self, batch):
+        return get_count_of_batch(self.posts_to_like_per_batch, batch)
+
+    def creators_to_follow(self, batch):
+        return get_count_of_batch(self.creators_to_follow_per_batch, batch)
+
+    def posts_to_watch_longer(self, batch):
+        return get_count_of_batch(self.posts_to_watch_longer_per_batch, batch)
+
+
+# plan of a test user without any actions
+EMPTY_ACTION_PLAN = ActionPlan.compile({})
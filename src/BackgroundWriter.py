@@ -0,0 +1,71 @@
+import queue
+import threading
+
+
+class BackgroundWriter:
+    """
+    Stores the posts of completed batches from a background thread while the next batch is scrolled, such that only the
+    posts of the last batch are left to be stored once the driver is closed. The writer has its own DatabaseHelper, as
+    a psycopg2 connection must not be used by two threads at the same time.
+    :param database: DatabaseHelper used by the writer thread only
+    :param logger:
+    :param test_user_id:
+    :param test_run_id:
+    """
+
+    def __init__(self, database, logger, test_user_id, test_run_id):
+        self.database = database
+        self.logger = logger
+        self.test_user_id = test_user_id
+        self.test_run_id = test_run_id
+        self.posts_queue = queue.Queue()
+        self.submitted = set()
+        self.stored_positions = {}
+        self.failed = set()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, post_id, data, position):
+        """
+        Queue a post to be stored.
+        :param post_id:
+        :param data: post data in the structure of api/recommend/item_list
+        :param position: {post_position: , batch_position: } of the post when it was submitted
+        :return:
+        """
+        self.submitted.add(post_id)
+        self.posts_queue.put((post_id, data, dict(position)))
+
+    def run(self):
+        while True:
+            post = self.posts_queue.get()
+            if post is None:
+                break
+            post_id, data, position = post
+            try:
+                self.database.store_data(data=data,
+                                         post_position=position.get('post_position'),
+                                         batch_position=position.get('batch_position'),
+                                         test_user_id=self.test_user_id,
+                                         test_run_id=self.test_run_id)
+                with self.lock:
+                    self.stored_positions[post_id] = position
+            except Exception as err:
+                self.logger.warning(f"Post {post_id} could not be stored in background for test user "
+                                    f"{self.test_user_id} in test run {self.test_run_id}, storing it at the end of the "
+                                    f"run instead: {err}")
+                with self.lock:
+                    self.failed.add(post_id)
+
+    def close(self):
+        """
+        Wait until all queued posts are stored, stop the writer thread and close its database connection. Closing a
+        closed writer again only returns the stored positions.
+        :return: {post_id: {post_position: , batch_position: }} of all posts stored by the writer
+        """
+        if self.thread.is_alive():
+            self.posts_queue.put(None)
+            self.thread.join()
+        self.database.close()
+        return self.stored_positions
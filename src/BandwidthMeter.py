@@ -0,0 +1,127 @@
+import json
+from urllib.parse import urlparse
+
+from selenium.common.exceptions import WebDriverException
+
+# Chrome capability enabling the performance log, which contains the Network.* events of the DevTools protocol
+PERFORMANCE_LOGGING_PREFS = {'performance': 'ALL'}
+
+
+class BandwidthMeter:
+    """
+    Byte counters of a driver session per host and per content type, read from Chrome's performance log. Response bytes
+    are the encoded bytes as transferred (headers and compressed body), i.e. the traffic that went through the proxy.
+    Request bytes are estimated from request line, headers and post data. Chrome only keeps the log until it is read,
+    thus update() shall be called regularly, e.g. once per batch. The meter may outlive a driver: drivers that are
+    discarded, e.g. sessions rejected for their DOM or relaunched after a failure, are counted up to the point they are
+    quit and the counts of the next driver are added to theirs.
+    Only traffic of Chrome is counted, requests sent from Python are not part of the performance log, e.g. video pages
+    fetched over the pooled HTTP session (fetch_separate_posts_over_http) or requested again with WebHelper.http_get.
+    :param driver: driver launched with PERFORMANCE_LOGGING_PREFS, None if no driver was launched yet
+    :param logger:
+    """
+
+    def __init__(self, driver, logger):
+        self.driver = driver
+        self.logger = logger
+        self.pending_requests = {}
+        self.requests_per_host = {}
+        self.request_bytes_per_host = {}
+        self.response_bytes_per_host = {}
+        self.response_bytes_per_content_type = {}
+
+    def update(self):
+        """
+        Read the performance log entries added since the last update and add them to the counters.
+        :return:
+        """
+        if self.driver is None:
+            return
+        try:
+            entries = self.driver.get_log('performance')
+        except WebDriverException as err:
+            self.logger.warning(f"Performance log could not be read: {err}")
+            return
+        for entry in entries:
+            message = json.loads(entry.get('message')).get('message', {})
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.requestWillBeSent':
+                self.add_request(params)
+            elif method == 'Network.responseReceived':
+                if params.get('requestId') in self.pending_requests:
+                    self.pending_requests[params.get('requestId')]['content_type'] = \
+                        params.get('response', {}).get('mimeType')
+            elif method == 'Network.loadingFinished':
+                self.add_response(params.get('requestId'), params.get('encodedDataLength', 0))
+            elif method == 'Network.loadingFailed':
+                self.pending_requests.pop(params.get('requestId'), None)
+
+    def switch_driver(self, driver):
+        """
+        Count the traffic of the current driver up to now and continue with another one. Requests still pending on the
+        current driver are dropped, they will never finish.
+        :param driver: driver to count from now on, None if the current driver is about to be quit
+        :return:
+        """
+        self.update()
+        self.pending_requests = {}
+        self.driver = driver
+
+    def add_request(self, params):
+        """
+        Count a request that is about to be sent, for redirects the bytes of the redirect response are counted first.
+        :param params: params of Network.requestWillBeSent
+        :return:
+        """
+        request = params.get('request', {})
+        url = request.get('url', '')
+        if not url.startswith('http'):  # data: and blob: urls do not cause any traffic
+            return
+        redirect_response = params.get('redirectResponse')
+        if redirect_response is not None and params.get('requestId') in self.pending_requests:
+            self.pending_requests[params.get('requestId')]['content_type'] = redirect_response.get('mimeType')
+            self.add_response(params.get('requestId'), redirect_response.get('encodedDataLength', 0))
+        host = urlparse(url).netloc
+        request_bytes = len(request.get('method', '')) + len(url) + len(request.get('postData', '') or '') \
+            + sum(len(name) + len(str(value)) + 4 for name, value in request.get('headers', {}).items())
+        self.requests_per_host[host] = self.requests_per_host.get(host, 0) + 1
+        self.request_bytes_per_host[host] = self.request_bytes_per_host.get(host, 0) + request_bytes
+        self.pending_requests[params.get('requestId')] = {'host': host, 'content_type': None}
+
+    def add_response(self, request_id, encoded_data_length):
+        """
+        Count the bytes of a finished response.
+        :param request_id:
+        :param encoded_data_length: bytes received including headers
+        :return:
+        """
+        request = self.pending_requests.pop(request_id, None)
+        if request is None:
+            return
+        response_bytes = int(encoded_data_length or 0)
+        content_type = request.get('content_type') or 'unknown'
+        self.response_bytes_per_host[request['host']] = \
+            self.response_bytes_per_host.get(request['host'], 0) + response_bytes
+        self.response_bytes_per_content_type[content_type] = \
+            self.response_bytes_per_content_type.get(content_type, 0) + response_bytes
+
+    def report(self):
+        """
+        Report of the bytes transferred, hosts and content types sorted by response bytes with the largest first.
+        :return: {requests: , request_bytes: , response_bytes: , hosts: {host: {requests: , request_bytes: ,
+        response_bytes: }}, content_types: {content_type: response_bytes}}
+        """
+        hosts = {}
+        for host in sorted(self.requests_per_host, key=lambda h: self.response_bytes_per_host.get(h, 0),
+                           reverse=True):
+            hosts[host] = {'requests': self.requests_per_host.get(host),
+                           'request_bytes': self.request_bytes_per_host.get(host, 0),
+                           'response_bytes': self.response_bytes_per_host.get(host, 0)}
+        content_types = dict(sorted(self.response_bytes_per_content_type.items(), key=lambda item: item[1],
+                                    reverse=True))
+        return {'requests': sum(self.requests_per_host.values()),
+                'request_bytes': sum(self.request_bytes_per_host.values()),
+                'response_bytes': sum(self.response_bytes_per_host.values()),
+                'hosts': hosts,
+                'content_types': content_types}
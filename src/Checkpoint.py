@@ -0,0 +1,228 @@
+import json
+import os
+from pathlib import Path
+
+from src.SessionRecorder import ReplayCapture
+from src.Tracer import Tracer
+
+# lists of the WebHelper that only grow during a session, checkpointed as the entries added since the last batch
+APPENDED_HELPER_LISTS = ('posts_liked', 'creators_followed')
+# collections of the WebHelper that only grow during a session, checkpointed as the members added since the last batch
+SEEN_HELPER_SETS = ('already_seen_content_creators', 'already_seen_music')
+
+
+def read_checkpoint(file_path):
+    """
+    Fold the records of a checkpoint into the state of the run after its last checkpointed batch. A last line that was
+    only partially written when the session died is ignored.
+    :param file_path: checkpoint written by BatchCheckpoint
+    :return: {test_user_id: , test_run_id: , number_of_batches: , batch: , completed: , post_position: ,
+    time_to_look_at_post_action: , posts: , post_batch_positions: , posts_watched_longer: , posts_liked: ,
+    creators_followed: , already_seen_content_creators: , already_seen_music: }, batch is None if no batch was
+    checkpointed yet
+    """
+    state = {'batch': None, 'completed': False, 'post_position': 0, 'time_to_look_at_post_action': 0, 'posts': {},
+             'post_batch_positions': {}, 'posts_watched_longer': {}}
+    state.update({name: [] for name in APPENDED_HELPER_LISTS + SEEN_HELPER_SETS})
+    with open(file_path) as file:
+        lines = file.readlines()
+    for number, line in enumerate(lines):
+        try:
+            record = json.loads(line)
+        except json.decoder.JSONDecodeError:
+            if number == len(lines) - 1:
+                break
+            raise
+        if record.get('type') == 'header':
+            state.update({key: record.get(key) for key in ('test_user_id', 'test_run_id', 'number_of_batches')})
+        elif record.get('type') == 'batch':
+            state['batch'] = record.get('batch')
+            state['post_position'] = record.get('post_position')
+            state['time_to_look_at_post_action'] = record.get('time_to_look_at_post_action')
+            state['posts'].update(record.get('posts'))
+            state['post_batch_positions'].update(record.get('post_batch_positions'))
+            state['posts_watched_longer'].update(record.get('posts_watched_longer'))
+            for name in APPENDED_HELPER_LISTS + SEEN_HELPER_SETS:
+                state[name].extend(record.get(name))
+        elif record.get('type') == 'completed':
+            state['completed'] = True
+    return state
+
+
+class BatchCheckpoint:
+    """
+    Append-only checkpoint of a run on local disk, written after every batch. Each record only holds what changed since
+    the previous batch: the data of posts that became visible, changed post and batch positions and the actions
+    performed, thus writing a checkpoint does not grow with the length of the run. If the session dies, the run can
+    either be stored as it is (CheckpointedSession) or continued in a fresh session (restore).
+    An existing checkpoint of the same test user and test run is appended to, such that a continued run extends it.
+    :param file_path: path of the checkpoint, e.g. checkpoint_<test run>_user_<test user>.jsonl
+    :param test_user_id:
+    :param test_run_id:
+    :param number_of_batches: number of batches of the entire run
+    """
+
+    def __init__(self, file_path, test_user_id, test_run_id, number_of_batches):
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        self.file_path = file_path
+        self.state = None
+        if Path(file_path).exists() and os.path.getsize(file_path) > 0:
+            self.state = read_checkpoint(file_path)
+            self.drop_partial_record()
+        self.file = open(file_path, 'a')
+        self.checkpointed_posts = set()
+        self.checkpointed_positions = {}
+        self.checkpointed_watched_longer = {}
+        self.checkpointed_list_lengths = {name: 0 for name in APPENDED_HELPER_LISTS}
+        self.checkpointed_seen = {name: set() for name in SEEN_HELPER_SETS}
+        if self.state is None:
+            self.write({'type': 'header', 'test_user_id': test_user_id, 'test_run_id': test_run_id,
+                        'number_of_batches': number_of_batches})
+        else:
+            self.checkpointed_posts = set(self.state.get('posts'))
+            self.checkpointed_positions = {post_id: dict(position) for post_id, position
+                                           in self.state.get('post_batch_positions').items()}
+            self.checkpointed_watched_longer = dict(self.state.get('posts_watched_longer'))
+            self.checkpointed_list_lengths = {name: len(self.state.get(name)) for name in APPENDED_HELPER_LISTS}
+            self.checkpointed_seen = {name: set(self.state.get(name)) for name in SEEN_HELPER_SETS}
+
+    def drop_partial_record(self):
+        """
+        Cut off a last record that was only partially written when the session died, such that records appended by the
+        continued run start on a new line.
+        :return:
+        """
+        with open(self.file_path, 'rb+') as file:
+            content = file.read()
+            if not content.endswith(b'\n'):
+                file.truncate(content.rfind(b'\n') + 1)
+
+    def can_resume(self):
+        """
+        :return: True if a previous session of the run checkpointed at least one batch and did not complete
+        """
+        return self.state is not None and self.state.get('batch') is not None and not self.state.get('completed')
+
+    def is_fully_checkpointed(self):
+        """
+        :return: True if a previous session of the run checkpointed its last batch but did not complete, i.e. the run
+        only has to be stored
+        """
+        return self.can_resume() and self.state.get('number_of_batches') is not None and \
+            self.state.get('batch') >= self.state.get('number_of_batches') - 1
+
+    def has_previous_session(self):
+        """
+        :return: True if a previous session of the run wrote to the checkpoint, whether it can be resumed or not
+        """
+        return self.state is not None
+
+    def write(self, record):
+        # flushed to disk right away, the checkpoint has to survive the process
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def record_batch(self, batch, data_storing):
+        """
+        Checkpoint the state of the run after a batch.
+        :param batch: number of the batch that was completed
+        :param data_storing: DataStoring of the session
+        :return:
+        """
+        helper = data_storing.helper
+        # posts of item lists are stored at the end of the run if they were visible in the feed, thus only those are
+        # checkpointed
+        posts = data_storing.get_visible_posts(excluded=self.checkpointed_posts)
+        positions = {post_id: dict(position) for post_id, position in helper.post_batch_positions.items()
+                     if self.checkpointed_positions.get(post_id) != position}
+        watched_longer = {post_id: seconds for post_id, seconds in helper.posts_watched_longer.items()
+                          if self.checkpointed_watched_longer.get(post_id) != seconds}
+        record = {'type': 'batch', 'batch': batch, 'post_position': helper.post_position,
+                  'time_to_look_at_post_action': helper.time_to_look_at_post_action, 'posts': posts,
+                  'post_batch_positions': positions, 'posts_watched_longer': watched_longer}
+        for name in APPENDED_HELPER_LISTS:
+            record[name] = getattr(helper, name)[self.checkpointed_list_lengths.get(name):]
+        for name in SEEN_HELPER_SETS:
+            # works for lists and sets of the helper alike
+            record[name] = [member for member in getattr(helper, name)
+                            if member not in self.checkpointed_seen.get(name)]
+        self.write(record)
+        self.checkpointed_posts.update(posts)
+        self.checkpointed_positions.update(positions)
+        self.checkpointed_watched_longer.update(watched_longer)
+        self.checkpointed_list_lengths = {name: len(getattr(helper, name)) for name in APPENDED_HELPER_LISTS}
+        for name in SEEN_HELPER_SETS:
+            self.checkpointed_seen.get(name).update(record.get(name))
+
+    def record_completed(self):
+        """
+        Mark the run as completed once its data is stored, the checkpoint is not resumed anymore.
+        :return:
+        """
+        self.write({'type': 'completed'})
+
+    def restore(self, data_storing):
+        """
+        Continue the checkpointed run in a fresh session: positions, actions and collected post data of the previous
+        session are taken over and the run continues with the batch after the last checkpointed one.
+        :param data_storing: DataStoring of the fresh session, created with the number of batches of the entire run
+        :return:
+        """
+        helper = data_storing.helper
+        helper.post_batch_positions = {post_id: dict(position) for post_id, position
+                                       in self.state.get('post_batch_positions').items()}
+        helper.post_position = self.state.get('post_position')
+        helper.posts_watched_longer = dict(self.state.get('posts_watched_longer'))
+        for name in APPENDED_HELPER_LISTS:
+            setattr(helper, name, list(self.state.get(name)))
+        for name in SEEN_HELPER_SETS:
+            # restored as the container type the helper uses, list or set
+            setattr(helper, name, type(getattr(helper, name))(self.state.get(name)))
+        helper.first_batch = helper.batch = self.state.get('batch') + 1
+        data_storing.first_batch = self.state.get('batch') + 1
+        data_storing.continued = True
+        data_storing.temp_data_collection = dict(self.state.get('posts'))
+        for post_data in self.state.get('posts').values():
+            helper.request_capture.post_index.add_post(post_data)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class CheckpointedSession:
+    """
+    Stands in for the WebHelper of a session that died, such that DataStoring can store the run as far as it was
+    checkpointed.
+    :param file_path: checkpoint written by BatchCheckpoint
+    :param logger:
+    """
+
+    def __init__(self, file_path, logger):
+        state = read_checkpoint(file_path)
+        self.logger = logger
+        self.tracer = Tracer()
+        self.test_user_id = state.get('test_user_id')
+        self.test_run_id = state.get('test_run_id')
+        self.batch = state.get('batch')
+        self.completed = state.get('completed')
+        self.posts = state.get('posts')
+        self.driver = None
+        self.request_capture = ReplayCapture(logger=logger)
+        self.post_batch_positions = state.get('post_batch_positions')
+        self.posts_liked = state.get('posts_liked')
+        self.creators_followed = state.get('creators_followed')
+        self.posts_watched_longer = state.get('posts_watched_longer')
+        self.time_to_look_at_post_action = state.get('time_to_look_at_post_action')
+
+    def store(self, data_storing):
+        """
+        Store the checkpointed posts and actions.
+        :param data_storing: DataStoring created with this session as helper
+        :return:
+        """
+        data_storing.temp_data_collection = dict(self.posts)
+        data_storing.continued = True
+        data_storing.store_collected_data()
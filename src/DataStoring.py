@@ -1,12 +1,19 @@
+import concurrent.futures
 import time
+from collections import Counter
 
-import brotli
 import requests
-from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 
+from src.ActionPlan import EMPTY_ACTION_PLAN
 from src.DatabaseHelper import *
+from src.NextData import extract_next_data
+from src.Tracer import traced
+
+# number of video pages of separate posts fetched in parallel and timeout in seconds per page
+SEPARATE_POSTS_FETCH_WORKERS = 5
+SEPARATE_POSTS_FETCH_TIMEOUT = 20
 
 
 class DataStoring:
@@ -15,21 +22,32 @@ class DataStoring:
     :param test_data: specifying test
     :param helper: Helper() object with current webdriver object
     :param number_of_batches: number of batches that shall be stored
+    :param recorder: SessionRecorder archiving every consumed item list and video page, nothing recorded if None
+    :param checkpoint: BatchCheckpoint written after every batch, no checkpoint if None
+    :param writer: BackgroundWriter storing the posts of completed batches while scrolling, all posts are stored at the
+    end of the run if None
     """
 
-    def __init__(self, helper, logger, database, number_of_batches, test_user_id, test_run_id):
+    def __init__(self, helper, logger, database, number_of_batches, test_user_id, test_run_id, recorder=None,
+                 checkpoint=None, writer=None):
         self.database = database
         self.helper = helper
+        self.tracer = helper.tracer
         self.logger = logger
         self.number_of_batches = number_of_batches
         self.test_user_id = test_user_id
         self.test_run_id = test_run_id
-        self.posts_seen_due_to_separate_posts = []
+        self.recorder = recorder
+        self.checkpoint = checkpoint
+        self.writer = writer
+        self.first_batch = 0  # batch a continued run starts with, see BatchCheckpoint.restore
+        self.continued = False  # run continued or stored from a checkpoint, an earlier attempt may have stored posts
+        self.posts_seen_due_to_separate_posts = set()
         self.posts_of_current_batch = []
-        self.already_checked_posts = []
+        self.already_checked_posts = set()
         self.current_total_posts = []
         self.separate_posts_not_stored = []
-        self.request_post_ids = []
+        self.request_post_ids = set()
         self.request_posts_not_on_feed = []
         self.temp_data_collection = {}
         self.first_post_href = None
@@ -55,91 +73,64 @@ class DataStoring:
                     self.helper.driver.find_element_by_tag_name('body').send_keys(Keys.CONTROL + Keys.HOME)
         for data in data_requests:
             for post in data:
-                self.request_post_ids.append(post.get('id'))
+                self.request_post_ids.add(post.get('id'))
 
     def get_request_response(self):
-        data_requests = []
+        """
+        Return the item lists of all api/recommend/item_list requests captured so far.
+        :return: list of item lists
+        """
         try:
-            for request in self.helper.driver.requests:
-                # look for correct request url
-                # check if request actually holds data, if not don't use it
-                if "https://m.tiktok.com/api/recommend/item_list/?aid=1988&app_name=tiktok_web&device_platform=web_pc" \
-                        in request.url and 'body' in request.response.__dir__():
-                    if len(request.response.body) > 0:
-                        data_requests.append(json.loads(request.response.body)['itemList'])
-            return data_requests
+            return [item_list.get('request_body') for item_list in self.helper.request_capture.get_item_lists()]
         except json.decoder.JSONDecodeError:
             raise json.decoder.JSONDecodeError
         except BaseException:
             raise BaseException('API/recommend/item_list request seems to be empty.')
 
     def get_api_recommend_item_list_requests(self):
+        """
+        Return all api/recommend/item_list requests captured so far together with their decoded item lists.
+        :return: [{request: , request_body: }]
+        """
         try:
-            api_recommend_itemList_requests = []
-            for request in self.helper.driver.requests:
-                try:
-                    # select the correct request among all: "api/recommend/item_list"
-                    # make sure response contains non-empty "body" attribute
-                    if "https://m.tiktok.com/api/recommend/item_list/?aid=1988&app_name=tiktok_web&device_platform" \
-                       "=web_pc" in request.url and 'body' in request.response.__dir__():
-                        if len(request.response.body) > 0:
-                            api_recommend_itemList_requests.append({'request': request,
-                                                                    'request_body': json.loads(request.response.body)
-                                                                    ['itemList']})
-                except json.decoder.JSONDecodeError:
-                    raise json.decoder.JSONDecodeError
-            return api_recommend_itemList_requests
+            return list(self.helper.request_capture.get_item_lists())
         except BaseException:
             raise BaseException("No api/recommmend/item_list requests found.")
 
-    def get_separate_posts_data(self, collecting_data_for_first_posts=True):
+    def get_separate_posts_data(self, collecting_data_for_first_posts=True, fetch_over_http=False):
         """
         Store data for each post that is not in request_post_ids, thus for each post for which data must be extracted
         on separate tab
         :param collecting_data_for_first_posts: Indicates whether first set of posts which is not included in
         api/recommend/item_list request shall be stored or not, because the additional watching time for each of those
         posts may distort the test results
+        :param fetch_over_http: fetch the video pages of the separate posts in parallel through a pooled HTTP session
+        instead of opening them on a separate tab, posts that could not be fetched are still opened on a separate tab
         :return:
         """
-        post_urls = self.helper.driver.find_elements(By.XPATH, '//span[@class="lazyload-wrapper"]/div/div/div[5]/div/a')
+        post_urls = [post for post in self.helper.get_batch_posts() if post.get('href') is not None]
+        fetched_pages = {}
+        if collecting_data_for_first_posts and fetch_over_http:
+            fetched_pages = self.fetch_separate_posts_over_http(
+                [url.get('href') for url in post_urls if url.get('post_id') not in self.request_post_ids])
         for url in post_urls:
-            curr_video_URL = url.get_attribute('href')
-            curr_post_id = curr_video_URL.rsplit('/', 1)[1]
+            curr_video_URL = url.get('href')
+            curr_post_id = url.get('post_id')
             if curr_post_id not in self.request_post_ids:
-                if collecting_data_for_first_posts:  # check if separate posts shall currently be stored or not
+                if collecting_data_for_first_posts and curr_video_URL in fetched_pages:
+                    self.posts_seen_due_to_separate_posts.add(curr_post_id)
+                    body, post_data = fetched_pages.get(curr_video_URL)
+                    self.store_separate_post_data(body=body, url=curr_video_URL, post_data=post_data)
+                elif collecting_data_for_first_posts:  # check if separate posts shall currently be stored or not
+                    self.helper.request_capture.expect_page(curr_video_URL)
                     self.helper.open_new_tab(curr_video_URL)
                     self.helper.pause_video(href=curr_video_URL)  # pausing video on separate tab
-                    self.posts_seen_due_to_separate_posts.append(curr_post_id)
-                    for request in self.helper.driver.requests:
-                        try:
-                            if request.url == curr_video_URL and len(request.response.body) > 0:
-                                # save data and decode response body in utf-8 format
-                                body = request.response.body
-                                try:
-                                    html_data = body.decode('utf-8')
-                                except UnicodeDecodeError as err:
-                                    self.logger.warning(err)
-                                    pass
-                                try:
-                                    decompressed_str = brotli.decompress(body)
-                                    html_data = decompressed_str.decode('utf-8')
-                                except Exception:
-                                    self.logger.warning('Request response can not be decoded.')
-                                    raise Exception
-                                soup = BeautifulSoup(html_data, 'lxml')
-                                data = json.loads(soup.find('script', id="__NEXT_DATA__").string)
-                                post_data = data['props']['pageProps']['itemInfo']['itemStruct']
-                                # post and batch position need to be updated separately for separate posts
-                                self.helper.current_post_id = post_data.get('id')
-                                self.helper.update_post_and_batch_positions(optional_batch_position=0)
-                                self.temp_store_data(data=post_data)
-                        except AttributeError as err:  # handling AttributeError of request.response.body is empty,
-                            self.logger.warning(err)  # thus of 'NoneType' and has no attribute body
-                            if request.response.body is None:
-                                self.store_data_if_visible(
-                                    request_data=json.loads(requests.get(request.url).text)['itemList'])
-                            else:
-                                raise AttributeError(err)
+                    self.posts_seen_due_to_separate_posts.add(curr_post_id)
+                    body = self.helper.request_capture.get_page_body(curr_video_URL)
+                    if body is None or len(body) == 0:  # response of video page not captured, request it again
+                        self.logger.warning(f"Response of {curr_video_URL} not captured, requesting it separately.")
+                        body = self.helper.http_get(curr_video_URL).content
+                    self.store_separate_post_data(body=body, url=curr_video_URL)
                     self.helper.close_second_tab()
 
                     # after closing separate tab first video should be paused again if it is playing
@@ -147,57 +138,117 @@ class DataStoring:
                 else:
                     self.separate_posts_not_stored.append(curr_post_id)
                     self.helper.current_post_id = curr_post_id
-                    self.helper.update_post_and_batch_positions(optional_batch_position=0)
+                    self.helper.update_post_and_batch_positions(optional_batch_position=self.first_batch)
                     self.logger.warning(f"Post with url: {curr_video_URL} not stored for user: {self.test_user_id}.")
-            time.sleep(2)
+            # separate tab must be closed before moving on with the next post
+            self.helper.wait_budget.until(self.helper.driver, 'get_separate_posts_data',
+                                          lambda driver: len(driver.window_handles) == 1, timeout=2)
         self.logger.warning(f"Following separate posts were not stored for user {self.test_user_id} in test run "
                             f"{self.test_run_id}: {self.separate_posts_not_stored}")
 
         # after handling separate posts, the first post shall still be paused as it was already watched in the meantime
 
+    def fetch_separate_posts_over_http(self, urls):
+        """
+        Fetch the video pages of separate posts in parallel through a pooled HTTP session using the proxy and cookies of
+        the current driver session. Only pages that hold the post data are returned, e.g. captcha or login pages served
+        instead of the video page are left to the separate tab.
+        :param urls: urls of the video pages
+        :return: {url: (response body, post data)} of all pages that could be fetched and parsed
+        """
+        fetched_pages = {}
+        if len(urls) == 0:
+            return fetched_pages
+        session = self.helper.get_http_session(pool_size=SEPARATE_POSTS_FETCH_WORKERS)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=SEPARATE_POSTS_FETCH_WORKERS) as executor:
+                futures = {executor.submit(session.get, url, timeout=SEPARATE_POSTS_FETCH_TIMEOUT): url for url in urls}
+                for future in concurrent.futures.as_completed(futures):
+                    url = futures.get(future)
+                    try:
+                        response = future.result()
+                        response.raise_for_status()
+                        if response.status_code != 200:
+                            raise requests.HTTPError(f"Unexpected status {response.status_code}.", response=response)
+                    except requests.RequestException as err:
+                        self.logger.warning(f"Video page {url} could not be fetched over HTTP, opening it on separate "
+                                            f"tab instead: {err}")
+                        continue
+                    try:
+                        post_data = self.get_post_data_from_page(response.content)
+                        if not isinstance(post_data, dict) or post_data.get('id') is None:
+                            raise ValueError("Post data without id.")
+                    except Exception as err:
+                        self.logger.warning(f"Video page {url} fetched over HTTP holds no post data, opening it on "
+                                            f"separate tab instead: {err!r}")
+                        continue
+                    fetched_pages[url] = (response.content, post_data)
+        finally:
+            session.close()
+        return fetched_pages
+
+    def get_post_data_from_page(self, body):
+        """
+        Extract the post data (itemStruct) from the response body of a video page.
+        :param body: decoded response body as bytes
+        :return: post data
+        """
+        try:
+            data = extract_next_data(body)
+        except UnicodeDecodeError as err:
+            self.logger.warning(err)
+            self.logger.warning('Request response can not be decoded.')
+            raise Exception
+        return data['props']['pageProps']['itemInfo']['itemStruct']
+
+    def store_separate_post_data(self, body, url=None, post_data=None):
+        """
+        Store the data of a separate post from the response body of its video page.
+        :param body:
+        :param url: url of the video page
+        :param post_data: post data already extracted from body, extracted here if None
+        :return:
+        """
+        if self.recorder is not None:
+            self.recorder.record_page(url, body)
+        if post_data is None:
+            post_data = self.get_post_data_from_page(body)
+        self.helper.request_capture.post_index.add_post(post_data)
+        # post and batch position need to be updated separately for separate posts
+        self.helper.current_post_id = post_data.get('id')
+        self.helper.update_post_and_batch_positions(optional_batch_position=self.first_batch)
+        self.temp_store_data(data=post_data)
+
     def get_request_posts_data(self,
                                time_to_look_at_post_action,
                                time_to_look_at_post_normal,
-                               number_of_posts_to_like_per_batch=None,
-                               number_of_creators_to_follow_per_batch=None,
-                               number_of_posts_to_watch_longer_per_batch=None,
-                               posts_with_hashtag_to_like=None,
-                               posts_with_hashtag_to_watch_longer=None,
-                               posts_of_content_creators_to_like=None,
-                               posts_of_music_ids_to_like=None):
+                               action_plan=None):
         """
         Collect data for those posts that are listed in api/recommend/item_list.
-        Like posts in a batch if specified as such in number_of_posts_to_like_per_batch,
+        Like posts in a batch if specified as such in the action plan's posts_to_like_per_batch,
         e.g. number_of_posts_to_like_per_batch = [0, 1, 0] => only like 1 post in 2nd batch
-        :param
+        :param action_plan: ActionPlan compiled from the test set, no actions if None
         :return:
         """
-        if posts_with_hashtag_to_like is None:
-            posts_with_hashtag_to_like = []
-        if posts_with_hashtag_to_watch_longer is None:
-            posts_with_hashtag_to_watch_longer = []
-        if posts_of_content_creators_to_like is None:
-            posts_of_content_creators_to_like = []
-        if posts_of_music_ids_to_like is None:
-            posts_of_music_ids_to_like = []
+        if action_plan is None:
+            action_plan = EMPTY_ACTION_PLAN
 
-        for batch in range(0, self.number_of_batches):
+        for batch in range(self.first_batch, self.number_of_batches):
 
             # get posts of current batch
-            self.current_total_posts = self.helper.driver.find_elements_by_xpath("//span[@class='lazyload-wrapper']")
+            self.current_total_posts = self.helper.get_batch_posts()
 
             # get the number of posts of current batch, if number of posts == 0 bot needs to scroll one more to trigger
             # loading of next batch ; update list of posts detected after running through first batch by deducting
             # number of posts already visited with list of post_batch_position
             self.update_posts_of_current_batch()
-            while self.posts_of_current_batch == 0:
-                self.helper.move_to_next_post()
-                self.current_total_posts = self.helper.driver.find_elements_by_xpath(
-                    "//span[@class='lazyload-wrapper']")
-                self.update_posts_of_current_batch()
+            if len(self.posts_of_current_batch) == 0:
+                self.helper.retry_policy.run(self.load_next_batch, accept=lambda posts: len(posts) > 0,
+                                             sleep=lambda seconds: self.helper.wait_budget.sleep('load_next_batch',
+                                                                                                 seconds))
 
             # update already_checked_posts
-            self.already_checked_posts.extend(self.posts_of_current_batch)
+            self.already_checked_posts.update(self.get_post_key(post) for post in self.posts_of_current_batch)
 
             # store info in logger and print it for monitoring purposes
             self.logger.warning(f"### Moving to batch number {batch} with {len(self.posts_of_current_batch)} posts for "
@@ -205,41 +256,36 @@ class DataStoring:
             print(f"### Moving to batch number {batch} with {len(self.posts_of_current_batch)} posts for "
                   f"test user {self.test_user_id} in test run {self.test_run_id}.")
 
-            # trigger like if applicable
-            number_of_posts_to_like = 0
-            if number_of_posts_to_like_per_batch is not None and 0 < len(number_of_posts_to_like_per_batch):
-                if len(number_of_posts_to_like_per_batch) > batch:
-                    number_of_posts_to_like = number_of_posts_to_like_per_batch[batch]
+            # log a summary of the loading events of the previous batch recorded in the page
+            readiness_events = Counter(event.get('type') for event in self.helper.get_readiness_events())
+            self.logger.warning(f"Readiness events before batch {batch} for test user {self.test_user_id} in test run "
+                                f"{self.test_run_id}: {dict(readiness_events)}.")
 
-            # trigger follow creators if applicable
-            number_of_creators_to_follow = 0
-            if number_of_creators_to_follow_per_batch is not None and 0 < len(number_of_creators_to_follow_per_batch):
-                if len(number_of_creators_to_follow_per_batch) > batch:
-                    number_of_creators_to_follow = number_of_creators_to_follow_per_batch[batch]
+            # resolve the durations of the batch's posts up front, such that watching a post only needs a lookup
+            self.helper.preload_durations(post.get('post_id') for post in self.posts_of_current_batch)
 
-            # trigger watching posts longer if applicable
-            number_of_posts_to_watch_longer = 0
-            if number_of_posts_to_watch_longer_per_batch is not None and 0 < len(number_of_posts_to_watch_longer_per_batch):
-                if len(number_of_posts_to_watch_longer_per_batch) > batch:
-                    number_of_posts_to_watch_longer = number_of_posts_to_watch_longer_per_batch[batch]
+            # read network events of the previous batch before Chrome's performance log grows too large
+            self.helper.bandwidth_meter.update()
 
             # scroll through batch and perform an action (like, follow etc.) if applicable
             # store on which posts an action was performed
             # posts with hashtags to like don't need a separate trigger handling as do like & follow
             self.helper.scroll_and_action(time_to_look_at_post_action=time_to_look_at_post_action,
                                           time_to_look_at_post_normal=time_to_look_at_post_normal,
-                                          number_of_posts_to_like=number_of_posts_to_like,
-                                          number_of_creators_to_follow=number_of_creators_to_follow,
-                                          number_of_posts_to_watch_longer=number_of_posts_to_watch_longer,
-                                          posts_with_hashtag_to_like=posts_with_hashtag_to_like,
-                                          posts_with_hashtag_to_watch_longer=posts_with_hashtag_to_watch_longer,
-                                          posts_of_content_creators_to_like=posts_of_content_creators_to_like,
-                                          posts_of_music_ids_to_like=posts_of_music_ids_to_like,
+                                          action_plan=action_plan,
                                           posts_of_current_batch=self.posts_of_current_batch,
                                           batch=batch,
                                           separate_posts_not_stored=self.separate_posts_not_stored,
                                           posts_seen_due_to_separate_posts=self.posts_seen_due_to_separate_posts)
 
+            # checkpoint the run such that it can be stored or continued if the session dies in a later batch
+            if self.checkpoint is not None:
+                self.checkpoint.record_batch(batch=batch, data_storing=self)
+
+            # store the posts seen so far in background while the next batch is scrolled
+            if self.writer is not None:
+                self.store_visible_posts_in_background()
+
         # iterate through all api/recommend/item_list requests
         request_list = self.get_api_recommend_item_list_requests()
 
@@ -249,16 +295,32 @@ class DataStoring:
         # store data
         for request in request_list:
             data = request.get('request_body')
+            if self.recorder is not None:
+                self.recorder.record_item_list(data)
             try:
                 self.store_data_if_visible(request_data=data)
             except AttributeError as err:  # handling AttributeError of request.response.body is empty,
                 self.logger.warning(err)  # thus of 'NoneType' and has no attribute body
                 if request.response.body is None:
-                    self.store_data_if_visible(request_data=json.loads(requests.get(request.url).text)['itemList'])
+                    self.store_data_if_visible(
+                        request_data=json.loads(self.helper.http_get(request.url).text)['itemList'])
                 else:
                     raise AttributeError(err)
         self.logger.warning(f"For {self.test_user_id} in {self.test_run_id} posts where in the following order: "
                             f"{self.helper.post_batch_positions}.")
+        if self.recorder is not None:
+            self.recorder.record_session_end(self.helper)
+
+    def load_next_batch(self):
+        """
+        Scroll one post further to trigger loading of the next batch and collect its posts.
+        :return: posts of the current batch, empty if the next batch did not load yet
+        """
+        if not self.helper.move_to_next_post():
+            return []
+        self.current_total_posts = self.helper.get_batch_posts()
+        self.update_posts_of_current_batch()
+        return self.posts_of_current_batch
 
     def update_posts_of_current_batch(self):
         """
@@ -266,11 +328,20 @@ class DataStoring:
         not yet been visited.
         :return:
         """
-        # current_total_posts and already_checked_posts to access post_id correctly?
-        self.posts_of_current_batch = []
-        for curr_post in self.current_total_posts:
-            if curr_post not in list(post for post in self.already_checked_posts):
-                self.posts_of_current_batch.append(curr_post)
+        self.posts_of_current_batch = [curr_post for curr_post in self.current_total_posts
+                                       if self.get_post_key(curr_post) not in self.already_checked_posts]
+
+    @staticmethod
+    def get_post_key(post):
+        """
+        Key identifying a post of the feed across batches. DOM positions shift once the feed recycles its nodes, thus
+        posts are identified by their id and only by their position in the feed if the id could not be extracted.
+        :param post: post as returned by WebHelper.get_batch_posts
+        :return: post id or ('index', position in the feed)
+        """
+        if post.get('post_id') is not None:
+            return post.get('post_id')
+        return 'index', post.get('index')
 
     def store_data_if_visible(self, request_data):
         """
@@ -296,6 +367,31 @@ class DataStoring:
                 if post_id not in self.request_posts_not_on_feed:
                     self.request_posts_not_on_feed.append(post_id)
 
+    def get_visible_posts(self, excluded):
+        """
+        Return the data of all posts collected so far that were shown on the ForYou feed: separate posts and posts of
+        the captured item lists that have a post and batch position.
+        :param excluded: ids of posts to leave out, e.g. those already handled
+        :return: {post_id: post data}
+        """
+        posts = {post_id: post_data for post_id, post_data in self.temp_data_collection.items()
+                 if post_id not in excluded}
+        for item_list in self.helper.request_capture.item_lists:
+            for post_data in item_list.get('request_body'):
+                post_id = post_data.get('id')
+                if post_id in self.helper.post_batch_positions and post_id not in excluded and post_id not in posts:
+                    posts[post_id] = post_data
+        return posts
+
+    def store_visible_posts_in_background(self):
+        """
+        Hand all visible posts not yet handed over to the background writer together with their current position.
+        :return:
+        """
+        for post_id, post_data in self.get_visible_posts(excluded=self.writer.submitted).items():
+            self.temp_store_data(data=post_data)
+            self.writer.submit(post_id=post_id, data=post_data, position=self.helper.post_batch_positions.get(post_id))
+
     def store_data_from_request(self, post_url, batch_position):
         """
         Get data from post url and store it
@@ -303,12 +399,9 @@ class DataStoring:
         :param post_url:
         :return:
         """
-        request = requests.get(post_url)
-        html_data = request.content.decode('utf-8')
-        soup = BeautifulSoup(html_data, 'lxml')
-        data = json.loads(soup.find('script', id="__NEXT_DATA__").string)
+        request = self.helper.http_get(post_url)
         self.post_position = self.database.store_data(
-            data=data['props']['pageProps']['itemInfo']['itemStruct'], post_position=self.post_position,
+            data=self.get_post_data_from_page(request.content), post_position=self.post_position,
             batch_position=batch_position, test_user_id=self.test_user_id, test_run_id=self.test_run_id)
 
     def temp_store_data(self, data):
@@ -323,6 +416,7 @@ class DataStoring:
         else:  # finding issue why some posts not stored in db
             self.logger.warning(f"Post {data.get('id')} is already in temp_data_collection list and thus not added again.")
 
+    @traced('store_collected_data')
     def store_collected_data(self):
         """
         After having run through posts of all batches, and the chrome driver being closed, this method stores the
@@ -334,15 +428,27 @@ class DataStoring:
         # update post_position here as before in store_data_if_visible()
         try:
             if self.helper.driver is None:
+                stored_positions = self.writer.close() if self.writer is not None else {}
                 for post in self.temp_data_collection.keys():
-                    self.database.store_data(
-                        data=self.temp_data_collection.get(post),
-                        post_position=self.helper.post_batch_positions.get(post).get('post_position'),
-                        batch_position=self.helper.post_batch_positions.get(post).get('batch_position'),
-                        test_user_id=self.test_user_id,
-                        test_run_id=self.test_run_id
-                    )
-                    self.logger.warning(f"Post {post} stored in db.")
+                    if post not in stored_positions:
+                        self.database.store_data(
+                            data=self.temp_data_collection.get(post),
+                            post_position=self.helper.post_batch_positions.get(post).get('post_position'),
+                            batch_position=self.helper.post_batch_positions.get(post).get('batch_position'),
+                            test_user_id=self.test_user_id,
+                            test_run_id=self.test_run_id
+                        )
+                        self.logger.warning(f"Post {post} stored in db.")
+                    # posts stored in background only need their position updated if they appeared again later, posts
+                    # stored by an earlier attempt of a continued run keep their rows when inserted
+                    if self.continued or (post in stored_positions and
+                                         stored_positions.get(post) != self.helper.post_batch_positions.get(post)):
+                        self.database.update_post_position(
+                            post_id=post,
+                            test_user_id=self.test_user_id,
+                            test_run_id=self.test_run_id,
+                            post_position=self.helper.post_batch_positions.get(post).get('post_position'),
+                            batch_position=self.helper.post_batch_positions.get(post).get('batch_position'))
                 self.logger.warning(f'Data storing completed for test run: {self.test_run_id} and test user: {self.test_user_id}.')
 
                 if len(self.helper.posts_liked) > 0:
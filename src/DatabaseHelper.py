@@ -5,15 +5,19 @@ import psycopg2
 from langdetect import detect
 from psycopg2.extras import execute_values
 
+from src.RetryPolicy import RetryError, RetryPolicy
+
 
 class DatabaseHelper:
     """
     class inserts extracted data to database
     - creates database connection
     - stores data
+    :param retry_policy: RetryPolicy bounding the attempts to store a post if the connection got lost
     """
 
-    def __init__(self):
+    def __init__(self, retry_policy=None):
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
         self.conn = None
         self.cur = None
         self.get_database_connection()
@@ -24,6 +28,18 @@ class DatabaseHelper:
         if self.cur is not None:
             self.cur.close()
 
+    def close(self):
+        """
+        Close cursor and connection, e.g. once a background writer is done.
+        :return:
+        """
+        if self.cur is not None:
+            self.cur.close()
+            self.cur = None
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
     def get_database_connection(self):
         """
         Establishes database connection
@@ -59,7 +75,8 @@ class DatabaseHelper:
     def store_data(self, data, post_position, batch_position, test_user_id, test_run_id):
         """
         Storing data of certain post, FYI: deleting data must be in the following order: 1st post_hashtag_relation,
-        2nd hashtag, 3rd post, 4th author, 5th music
+        2nd hashtag, 3rd post, 4th author, 5th music. If the connection got lost, it is re-established and storing is
+        attempted again within the limits of the retry policy.
         :param batch_position:
         :param test_user_id:
         :param test_run_id:
@@ -67,6 +84,32 @@ class DatabaseHelper:
         :param data:
         :return:
         """
+        def reconnect(attempt, cursor_error):
+            print(cursor_error)
+            print("Instantiating db connection and trying to store data again.")
+            self.get_database_connection()
+
+        try:
+            self.retry_policy.run(lambda: self.insert_post_data(data, post_position, batch_position, test_user_id,
+                                                                test_run_id),
+                                  retry_on=(psycopg2.InterfaceError, psycopg2.OperationalError), on_retry=reconnect)
+        except RetryError as error:
+            print(error.last_error)
+            raise Exception("Post data could not be stored")
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(error)
+            raise Exception("Post data could not be stored")
+
+    def insert_post_data(self, data, post_position, batch_position, test_user_id, test_run_id):
+        """
+        Insert author, hashtags, music, post and post_hashtag_relation of a post.
+        :param data:
+        :param post_position:
+        :param batch_position:
+        :param test_user_id:
+        :param test_run_id:
+        :return:
+        """
 
         def get_label(iso):
             file_path = (self.base_path / "../Request Data/LanguageList.json").resolve()
@@ -87,118 +130,109 @@ class DatabaseHelper:
             except:
                 return ''
 
+        if test_run_id is None:  # stop code execution if testrunid is None
+            raise Exception("TestrunID is None.")
+
+        # handle music_id
         try:
-            if test_run_id is None:  # stop code execution if testrunid is None
-                raise Exception("TestrunID is None.")
+            music_id = int(data['music'].get('id'))
+        except ValueError as e:
+            print(data)
+            print(e)
+            music_id = 0
+            print(f"Storing the music_id = 0 as no actual id was given for post {int(data.get('id'))}.")
+
+        # save plan: save author, hashtag, music, post, post_hashtag_relation
+        ## AUTHOR
+        # store author
+        author = """insert into d1rpgcvqcran0q.public.authors(id, nickname, uniqueid, followercount, followingcount,
+            heart, heartcount, videocount, diggcount) values (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            on conflict on constraint authors_pkey do nothing"""
+        self.cur.execute(author, (
+            int(data['author'].get('id')),  # authorid
+            data['author'].get('nickname'),  # nickname
+            data['author'].get('uniqueId'),  # uniqueid
+            data['authorStats'].get('followerCount'),  # followercount
+            data['authorStats'].get('followingCount'),  # followingcount
+            data['authorStats'].get('heart'),  # heart
+            data['authorStats'].get('heartCount'),  # heartcount
+            data['authorStats'].get('videoCount'),  # videocount
+            data['authorStats'].get('diggCount'),  # diggCount
+        ))
+        self.conn.commit()
 
-            # handle music_id
+        ## HASHTAGS
+        # store hashtags with corresponding postid
+        hashtag = """insert into d1rpgcvqcran0q.public.hashtags(id, name, iscommerce) values(%s,%s,%s)
+                on conflict on constraint hashtags_pkey do nothing"""
+        for tag in data.get('textExtra', []):  # if 'textExtra' element doesn't exist continue
+            if tag.get('hashtagId') != '':
+                self.cur.execute(hashtag, (
+                    int(tag.get('hashtagId')),
+                    tag.get('hashtagName'),
+                    tag.get('isCommerce'),
+                ))
+                self.conn.commit()
+
+        ## MUSIC
+        if self.check_for_music_internal_id(music_id=music_id):
+            music = """insert into d1rpgcvqcran0q.public.music(id, duration_sec, title) values(%s,%s,%s)
+            on conflict on constraint music_pkey do nothing"""
             try:
-                music_id = int(data['music'].get('id'))
+                self.cur.execute(music, (
+                    music_id,  # musicid
+                    data['music'].get('duration'),  # music_duration_sec
+                    data['music'].get('title'),  # music_title
+                ))
+                self.conn.commit()
             except ValueError as e:
-                print(data)
                 print(e)
-                music_id = 0
-                print(f"Storing the music_id = 0 as no actual id was given for post {int(data.get('id'))}.")
-
-            # save plan: save author, hashtag, music, post, post_hashtag_relation
-            ## AUTHOR
-            # store author
-            author = """insert into d1rpgcvqcran0q.public.authors(id, nickname, uniqueid, followercount, followingcount,
-                heart, heartcount, videocount, diggcount) values (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                on conflict on constraint authors_pkey do nothing"""
-            self.cur.execute(author, (
-                int(data['author'].get('id')),  # authorid
-                data['author'].get('nickname'),  # nickname
-                data['author'].get('uniqueId'),  # uniqueid
-                data['authorStats'].get('followerCount'),  # followercount
-                data['authorStats'].get('followingCount'),  # followingcount
-                data['authorStats'].get('heart'),  # heart
-                data['authorStats'].get('heartCount'),  # heartcount
-                data['authorStats'].get('videoCount'),  # videocount
-                data['authorStats'].get('diggCount'),  # diggCount
-            ))
-            self.conn.commit()
-
-            ## HASHTAGS
-            # store hashtags with corresponding postid
-            hashtag = """insert into d1rpgcvqcran0q.public.hashtags(id, name, iscommerce) values(%s,%s,%s)
-                    on conflict on constraint hashtags_pkey do nothing"""
-            for tag in data.get('textExtra', []):  # if 'textExtra' element doesn't exist continue
-                if tag.get('hashtagId') != '':
-                    self.cur.execute(hashtag, (
-                        int(tag.get('hashtagId')),
-                        tag.get('hashtagName'),
-                        tag.get('isCommerce'),
-                    ))
-                    self.conn.commit()
-
-            ## MUSIC
-            if self.check_for_music_internal_id(music_id=music_id):
-                music = """insert into d1rpgcvqcran0q.public.music(id, duration_sec, title) values(%s,%s,%s)
-                on conflict on constraint music_pkey do nothing"""
-                try:
-                    self.cur.execute(music, (
-                        music_id,  # musicid
-                        data['music'].get('duration'),  # music_duration_sec
-                        data['music'].get('title'),  # music_title
-                    ))
-                    self.conn.commit()
-                except ValueError as e:
-                    print(e)
-            else:
-                print(f"Music data for post {int(data.get('id'))} not stored as music_id {music_id} "
-                      f"already exists in music table.")
-
-            ## POSTS
-            # when passing data to sql query string they all need to use the %s placeholder, psycopg converts in
-            # SQL representation
-
-            posts = """insert into d1rpgcvqcran0q.public.posts(id,desc_iteminfo,fullurl,language_iso_long,language_label,
-                video_druation_sec,likes_diggcount,sharecount,commentcount,playcount,musicid,authorid,testrunid,
-                post_position,isAd,testuserid,batch_position,music_internal_id) 
-                values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s) 
-                on conflict on constraint posts_pkey do nothing;"""
-            self.cur.execute(posts, (
-                int(data.get('id')),  # id
-                data.get('desc', ''),  # desc_iteminfo
-                'https://www.tiktok.com/@' + data['author'].get('uniqueId') + "/video/" + data.get('id'),  # fullurl
-                get_language(data.get('desc', '')),  # language_iso_long: here using langdetect library to detect
-                get_label(get_language(data.get('desc', ''))),  # language_label
-                data['video'].get('duration'),  # video_druation_sec
-                data['stats'].get('diggCount'),  # likes_diggcount: diggCount = likes
-                data['stats'].get('shareCount'),  # sharecount
-                data['stats'].get('commentCount'),  # commentcount
-                data['stats'].get('playCount'),  # playcount
-                music_id,  # musicid foreign key
-                int(data['author'].get('id')),  # authorid foreign key
-                test_run_id,  # test_run_id foreign key
-                post_position,  # post_position
-                data.get('isAd'),  # isAd
-                test_user_id,  # current test_user_id
-                batch_position,  # batch number in which post appeared
-                self.current_music_internal_id,  # store current internal music id
-            ))
-            self.conn.commit()
+        else:
+            print(f"Music data for post {int(data.get('id'))} not stored as music_id {music_id} "
+                  f"already exists in music table.")
+
+        ## POSTS
+        # when passing data to sql query string they all need to use the %s placeholder, psycopg converts in
+        # SQL representation
+
+        posts = """insert into d1rpgcvqcran0q.public.posts(id,desc_iteminfo,fullurl,language_iso_long,language_label,
+            video_druation_sec,likes_diggcount,sharecount,commentcount,playcount,musicid,authorid,testrunid,
+            post_position,isAd,testuserid,batch_position,music_internal_id) 
+            values (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s) 
+            on conflict on constraint posts_pkey do nothing;"""
+        self.cur.execute(posts, (
+            int(data.get('id')),  # id
+            data.get('desc', ''),  # desc_iteminfo
+            'https://www.tiktok.com/@' + data['author'].get('uniqueId') + "/video/" + data.get('id'),  # fullurl
+            get_language(data.get('desc', '')),  # language_iso_long: here using langdetect library to detect
+            get_label(get_language(data.get('desc', ''))),  # language_label
+            data['video'].get('duration'),  # video_druation_sec
+            data['stats'].get('diggCount'),  # likes_diggcount: diggCount = likes
+            data['stats'].get('shareCount'),  # sharecount
+            data['stats'].get('commentCount'),  # commentcount
+            data['stats'].get('playCount'),  # playcount
+            music_id,  # musicid foreign key
+            int(data['author'].get('id')),  # authorid foreign key
+            test_run_id,  # test_run_id foreign key
+            post_position,  # post_position
+            data.get('isAd'),  # isAd
+            test_user_id,  # current test_user_id
+            batch_position,  # batch number in which post appeared
+            self.current_music_internal_id,  # store current internal music id
+        ))
+        self.conn.commit()
 
-            ## POST_HASHTAG_RELATION
-            post_hashtag = """insert into d1rpgcvqcran0q.public.post_hashtag_relation(postid, hashtagid, testrunid) 
-                values(%s,%s,%s) on conflict on constraint post_hashtag_relation_pkey do nothing"""
-            for tag in data.get('textExtra', []):
-                if tag.get('hashtagId') != '':
-                    self.cur.execute(post_hashtag, (
-                        int(data.get('id')),  # postid foreign key
-                        int(tag.get('hashtagId')),  # hashtagid foreign key
-                        test_run_id,  # testrunid foreign key
-                    ))
-                    self.conn.commit()
-        except (psycopg2.InterfaceError, psycopg2.OperationalError) as cursor_error:
-            print(cursor_error)
-            print("Instantiating db connection and trying to store data again.")
-            self.get_database_connection()
-            self.store_data(data, post_position, batch_position, test_user_id, test_run_id)
-        except (Exception, psycopg2.DatabaseError) as error:
-            print(error)
-            raise Exception("Post data could not be stored")
+        ## POST_HASHTAG_RELATION
+        post_hashtag = """insert into d1rpgcvqcran0q.public.post_hashtag_relation(postid, hashtagid, testrunid) 
+            values(%s,%s,%s) on conflict on constraint post_hashtag_relation_pkey do nothing"""
+        for tag in data.get('textExtra', []):
+            if tag.get('hashtagId') != '':
+                self.cur.execute(post_hashtag, (
+                    int(data.get('id')),  # postid foreign key
+                    int(tag.get('hashtagId')),  # hashtagid foreign key
+                    test_run_id,  # testrunid foreign key
+                ))
+                self.conn.commit()
 
     def check_for_music_internal_id(self, music_id):
         """
@@ -303,6 +337,54 @@ class DatabaseHelper:
             print(error)
             raise Exception(f"Data of liked post {postid} could not be stored.")
 
+    def delete_test_user_data(self, test_user_id, test_run_id):
+        """
+        Delete everything stored for a test user in a test run, e.g. the posts a failed attempt stored in background
+        before the test user is run again from the start. Hashtags, authors and music are shared and kept.
+        :param test_user_id:
+        :param test_run_id:
+        :return:
+        """
+        try:
+            sql_delete_post_hashtags = """delete from d1rpgcvqcran0q.public.post_hashtag_relation where testrunid = %s 
+                and postid in (select id from d1rpgcvqcran0q.public.posts where testuserid = %s and testrunid = %s)"""
+            self.cur.execute(sql_delete_post_hashtags, (test_run_id, test_user_id, test_run_id))
+            sql_delete_liked_posts = """delete from d1rpgcvqcran0q.public.liked_post where testuser_id = %s and 
+                testrun_id = %s"""
+            self.cur.execute(sql_delete_liked_posts, (test_user_id, test_run_id))
+            sql_delete_authors_followed = """delete from d1rpgcvqcran0q.public.author_followed where test_user_id = %s 
+                and test_run_id = %s"""
+            self.cur.execute(sql_delete_authors_followed, (test_user_id, test_run_id))
+            sql_delete_longer_watched_posts = """delete from longer_watched_posts where test_user_id = %s and 
+                test_run_id = %s"""
+            self.cur.execute(sql_delete_longer_watched_posts, (test_user_id, test_run_id))
+            sql_delete_posts = """delete from d1rpgcvqcran0q.public.posts where testuserid = %s and testrunid = %s"""
+            self.cur.execute(sql_delete_posts, (test_user_id, test_run_id))
+            self.conn.commit()
+        except (Exception, psycopg2.DatabaseError) as error:
+            self.conn.rollback()
+            print(error)
+            raise Exception(f"Data of test user {test_user_id} in test run {test_run_id} could not be deleted.")
+
+    def update_post_position(self, post_id, test_user_id, test_run_id, post_position, batch_position):
+        """
+        Update the post and batch position of a post that was stored before it appeared again at a later position.
+        :param post_id:
+        :param test_user_id:
+        :param test_run_id:
+        :param post_position:
+        :param batch_position:
+        :return:
+        """
+        try:
+            sql = """update d1rpgcvqcran0q.public.posts set post_position = %s, batch_position = %s 
+                where id = %s and testuserid = %s and testrunid = %s"""
+            self.cur.execute(sql, (post_position, batch_position, post_id, test_user_id, test_run_id))
+            self.conn.commit()
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(error)
+            raise Exception(f"Position of post {post_id} could not be updated.")
+
     def update_followed_post(self, author_id, post_id, test_user_id, test_run_id):
         """
         Update the author_followed table with the content creator a test user started to follow in a specific test run.
@@ -428,6 +510,22 @@ class DatabaseHelper:
         else:
             return 0
 
+    def get_durations(self, post_ids):
+        """
+        Retrieve the durations of several posts within one query, posts not stored or stored without duration are
+        omitted.
+        :param post_ids:
+        :return: {post_id: duration in seconds}, post ids as strings like the ids read from the feed, not as the bigint
+        ids of the table posts
+        """
+        post_ids = tuple(post_ids)
+        if len(post_ids) == 0:
+            return {}
+        sql_get_durations = """select id, video_druation_sec from posts where id in %s and video_druation_sec is not 
+        null"""
+        self.cur.execute(sql_get_durations, (post_ids,))
+        return {str(post_id): duration for post_id, duration in self.cur.fetchall()}
+
     def store_longer_watched_post(self, post_id, test_user_id, test_run_id, time_watched, percentage_watched):
         """
         Store the post id, test run id, and test user id where the bot watched a post longer than usually.
@@ -0,0 +1,411 @@
+import concurrent.futures
+import functools
+import itertools
+import json
+import random
+import threading
+import time
+from pathlib import Path
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.wait import WebDriverWait
+from seleniumwire import webdriver
+
+from src.BandwidthMeter import PERFORMANCE_LOGGING_PREFS
+from src.RequestCapture import RequestCapture, REQUEST_STORAGE_MAX_SIZE
+from src.RetryPolicy import RetryPolicy
+
+base_path = Path(__file__).parent
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) " \
+             "Chrome/74.0.3729.169 Safari/537.36"
+
+# page load strategies of Chrome: "normal" waits for the load event, "eager" for DOMContentLoaded, "none" does not wait
+PAGE_LOAD_STRATEGIES = ('normal', 'eager', 'none')
+# script returning the pc attribute of the root element as soon as the document is interactive, false while loading
+ROOT_ELEMENT_PC_SCRIPT = """
+if (document.readyState === 'loading' || document.documentElement === null) {
+    return false;
+}
+return {pc: document.documentElement.getAttribute('pc')};
+"""
+# ceiling in seconds for the root element of TikTok to become available
+ROOT_ELEMENT_TIMEOUT = 30
+
+
+@functools.lru_cache(maxsize=None)
+def load_db_credentials():
+    """
+    Read db_credentials.json only once per process.
+    :return: credentials dictionary
+    """
+    file_path_db = (base_path / "../utilities/db_credentials.json").resolve()
+    with open(file_path_db) as file:
+        return json.load(file)
+
+
+def build_chrome_options(browser_language, page_load_strategy=None, headless=False):
+    """
+    Chrome options of a session: bypassing detection of automated software testing, language, random window size,
+    performance log.
+    :param browser_language:
+    :param page_load_strategy: one of PAGE_LOAD_STRATEGIES, Chrome's default "normal" if None
+    :param headless: run Chrome without window, e.g. for benchmarks against the local feed server
+    :return: ChromeOptions
+    """
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_experimental_option('prefs', {'intl.accept_languages': f'{browser_language}'})
+    chrome_options.add_argument(f'--lang={browser_language}')
+
+    sizes = list(itertools.combinations([800, 825, 850, 875, 900], 2))
+    random_size = random.choice(sizes)
+    chrome_options.add_argument(f'--window-size={random_size[0]},{random_size[1]}')
+    chrome_options.add_argument(f"user-agent={USER_AGENT}")
+
+    chrome_options.add_argument('incognito')
+    # Chrome bypasses proxies for localhost, requests to a local feed server need to pass seleniumwire as well
+    chrome_options.add_argument('--proxy-bypass-list=<-loopback>')
+    if headless:
+        chrome_options.add_argument('--headless')
+    # performance log of the DevTools network events, read by BandwidthMeter
+    chrome_options.set_capability('goog:loggingPrefs', PERFORMANCE_LOGGING_PREFS)
+    if page_load_strategy is not None:
+        if page_load_strategy not in PAGE_LOAD_STRATEGIES:
+            raise ValueError(f"Page load strategy {page_load_strategy} not supported.")
+        chrome_options.set_capability('pageLoadStrategy', page_load_strategy)
+    return chrome_options
+
+
+def build_seleniumwire_options(proxy, capture_scope=False, streaming_capture=False):
+    """
+    Seleniumwire options of a session: upstream proxy if provided and bounded request storage for the capture scope and
+    streaming capture, which remove the requests they consumed from the in-memory request log.
+    :param proxy: dictionary of {proxy_username, proxy_password, proxy_host, proxy_port} or None
+    :param capture_scope:
+    :param streaming_capture:
+    :return: seleniumwire options
+    """
+    options = {}
+    if proxy is not None:
+        url = "{proxy_username}:{proxy_password}@{proxy_host}:{proxy_port}".format(
+            proxy_username=proxy['proxy_username'], proxy_password=proxy['proxy_password'],
+            proxy_host=proxy['proxy_host'], proxy_port=proxy['proxy_port'])
+        options = {
+            'proxy': {
+                'http': 'http://' + url,
+                'https': 'https://' + url,
+                'no_proxy': 'localhost,127.0.0.1'
+            }
+        }
+    # keep request log in memory and bounded, with capture scope only requests within the scope are stored
+    if capture_scope or streaming_capture:
+        options['request_storage'] = 'memory'
+        options['request_storage_max_size'] = REQUEST_STORAGE_MAX_SIZE
+    return options
+
+
+def create_driver(proxy, browser_language, capture_scope=False, page_load_strategy=None, headless=False,
+                  streaming_capture=False):
+    """
+    Launch a new Chrome driver session without opening any page yet.
+    :param proxy:
+    :param browser_language:
+    :param capture_scope:
+    :param page_load_strategy:
+    :param headless:
+    :param streaming_capture:
+    :return: seleniumwire webdriver
+    """
+    chrome_options = build_chrome_options(browser_language, page_load_strategy, headless)
+    options = build_seleniumwire_options(proxy, capture_scope, streaming_capture)
+    # check if ".exe" appendix necessary or not depending on machine
+    if load_db_credentials().get('user') == 'PLACEHOLDER':
+        return webdriver.Chrome(chrome_options=chrome_options, seleniumwire_options=options,
+                                executable_path='PLACEHOLDER')
+    file_path_chromedriver = (base_path / "../chromedriver.exe").resolve()
+    return webdriver.Chrome(chrome_options=chrome_options, seleniumwire_options=options,
+                            executable_path=file_path_chromedriver)
+
+
+def open_tiktok(driver, base_url):
+    """
+    Hide the webdriver flag and open TikTok.
+    :param driver:
+    :param base_url:
+    :return:
+    """
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    driver.get(base_url)
+
+
+def is_desktop_dom(driver, timeout=ROOT_ELEMENT_TIMEOUT):
+    """
+    TikTok occasionally loads the DOM of the mobile application, the desktop DOM is marked by <html pc="yes">. The root
+    element is read as soon as the document is interactive, such that with the page load strategy "eager" or "none"
+    a mobile session is recognised before the remaining page has been loaded.
+    :param driver:
+    :param timeout: ceiling in seconds for the document to become interactive
+    :return: True if desktop DOM loaded, False if mobile DOM loaded, raises TimeoutException if the document did not
+    become interactive in time
+    """
+    root_element = WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+        lambda d: d.execute_script(ROOT_ELEMENT_PC_SCRIPT))
+    return root_element.get('pc') == 'yes'
+
+
+class MobileDomRejections:
+    """
+    Count of sessions that were quit because TikTok loaded the mobile DOM and the time spent on them, from launching the
+    driver until it was quit. Sessions whose document did not become interactive in time are counted separately, as
+    their DOM is unknown. Sessions may be rejected from several threads of the driver pool.
+    The rejections of a run are counted on their own and added to the counts of the driver pool (parent), every
+    rejection of a run is written to its trace as span.
+    :param parent: MobileDomRejections the rejections are added to as well, e.g. the one of the driver pool, or None
+    :param tracer: Tracer of the run the rejections belong to or None
+    """
+
+    def __init__(self, parent=None, tracer=None):
+        self.parent = parent
+        self.tracer = tracer
+        self.sessions = 0
+        self.seconds = 0
+        self.timeouts = 0
+        self.timeout_seconds = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        """
+        Add a rejected session.
+        :param seconds: time spent on the session
+        :return:
+        """
+        with self.lock:
+            self.sessions += 1
+            self.seconds += seconds
+        if self.tracer is not None:
+            self.tracer.record('mobile_dom_rejection', time.time() - seconds, seconds)
+        if self.parent is not None:
+            self.parent.record(seconds)
+
+    def record_timeout(self, seconds):
+        """
+        Add a session that was quit because its document did not become interactive in time.
+        :param seconds: time spent on the session
+        :return:
+        """
+        with self.lock:
+            self.timeouts += 1
+            self.timeout_seconds += seconds
+        if self.tracer is not None:
+            self.tracer.record('mobile_dom_timeout', time.time() - seconds, seconds)
+        if self.parent is not None:
+            self.parent.record_timeout(seconds)
+
+    def report(self):
+        """
+        :return: {sessions: , seconds: , timeouts: , timeout_seconds: }
+        """
+        with self.lock:
+            return {'sessions': self.sessions, 'seconds': round(self.seconds, 3), 'timeouts': self.timeouts,
+                    'timeout_seconds': round(self.timeout_seconds, 3)}
+
+
+def quit_driver(driver, bandwidth_meter=None):
+    """
+    Quit a driver, its traffic is counted first if it is metered.
+    :param driver:
+    :param bandwidth_meter: BandwidthMeter currently counting the traffic of driver or None
+    :return:
+    """
+    if bandwidth_meter is not None:
+        bandwidth_meter.switch_driver(None)
+    driver.quit()
+
+
+def validate_desktop_session(driver, base_url, mobile_dom_rejections, start, bandwidth_meter=None):
+    """
+    Open TikTok and check for the desktop DOM, the driver is quit if TikTok loaded the mobile DOM or opening it failed.
+    :param driver:
+    :param base_url:
+    :param mobile_dom_rejections: MobileDomRejections the quit session is recorded in
+    :param start: time the session was launched
+    :param bandwidth_meter: BandwidthMeter counting the traffic of driver, None if it is not metered
+    :return: True if desktop DOM loaded, False if the session was rejected for the mobile DOM, raises the error of
+    opening TikTok otherwise
+    """
+    try:
+        open_tiktok(driver, base_url)
+        desktop_dom = is_desktop_dom(driver)
+    except TimeoutException:
+        quit_driver(driver, bandwidth_meter)
+        mobile_dom_rejections.record_timeout(time.time() - start)
+        raise
+    except Exception:
+        quit_driver(driver, bandwidth_meter)
+        raise
+    if not desktop_dom:
+        quit_driver(driver, bandwidth_meter)
+        mobile_dom_rejections.record(time.time() - start)
+    return desktop_dom
+
+
+class DriverPool:
+    """
+    Pool of driver sessions launched and validated in the background, such that a session with the desktop DOM is
+    ready when a test user needs it. Sessions are kept per proxy, browser language and capture settings. Drivers hold
+    a proxy thread of this process, thus every process has its own pool.
+    :param logger:
+    :param base_url: page opened to validate the DOM
+    :param max_workers: number of sessions launched concurrently
+    :param headless: launch Chrome without window
+    :param retry_policy: RetryPolicy bounding the sessions launched until one loads the desktop DOM
+    """
+
+    def __init__(self, logger, base_url="https://tiktok.com/", max_workers=2, headless=False, retry_policy=None):
+        self.logger = logger
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy(max_attempts=10)
+        self.base_url = base_url
+        self.headless = headless
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.mobile_dom_rejections = MobileDomRejections()
+
+    @staticmethod
+    def get_key(proxy, browser_language, streaming_capture=False, capture_scope=False, page_load_strategy=None,
+                block_media=False):
+        proxy_key = None if proxy is None else (proxy.get('proxy_host'), str(proxy.get('proxy_port')))
+        return proxy_key, browser_language, bool(streaming_capture), bool(capture_scope), page_load_strategy, \
+            bool(block_media)
+
+    def prewarm(self, proxy, browser_language, streaming_capture=False, capture_scope=False, page_load_strategy=None,
+                block_media=False):
+        """
+        Launch and validate a session in the background. The feed is left right after the DOM was validated, such that
+        the session does not watch posts before it is handed over.
+        :param proxy:
+        :param browser_language:
+        :param streaming_capture:
+        :param capture_scope:
+        :param page_load_strategy:
+        :param block_media:
+        :return: future of (driver, request_capture)
+        """
+        key = self.get_key(proxy, browser_language, streaming_capture, capture_scope, page_load_strategy, block_media)
+        future = self.executor.submit(self.launch_desktop_session, None if proxy is None else dict(proxy),
+                                      browser_language, streaming_capture, capture_scope, page_load_strategy,
+                                      block_media, leave_feed=True)
+        with self.lock:
+            self.pending.setdefault(key, []).append(future)
+        self.logger.warning(f"Prewarming driver session for {key}.")
+        return future
+
+    def acquire(self, proxy, browser_language, streaming_capture=False, capture_scope=False, page_load_strategy=None,
+                block_media=False, logger=None, bandwidth_meter=None, mobile_dom_rejections=None):
+        """
+        Hand over a session with desktop DOM, use the first prewarmed one that is ready, launch one if none pending.
+        A prewarmed session opens the feed again when it is handed over, thus the test user starts on a fresh feed.
+        Traffic is metered from the hand over on, including sessions launched and rejected for the test user.
+        :param proxy:
+        :param browser_language:
+        :param streaming_capture:
+        :param capture_scope:
+        :param page_load_strategy:
+        :param block_media:
+        :param logger: logger of the test user the session is handed to, the logger of the pool if None
+        :param bandwidth_meter: BandwidthMeter of the test user or None
+        :param mobile_dom_rejections: MobileDomRejections of the test user, whose parent shall be the one of the pool,
+        the one of the pool if None
+        :return: driver, request_capture
+        """
+        logger = logger if logger is not None else self.logger
+        mobile_dom_rejections = mobile_dom_rejections if mobile_dom_rejections is not None \
+            else self.mobile_dom_rejections
+        key = self.get_key(proxy, browser_language, streaming_capture, capture_scope, page_load_strategy, block_media)
+        with self.lock:
+            futures = self.pending.pop(key, [])
+        if len(futures) > 0:
+            done, not_done = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            future = done.pop()
+            with self.lock:
+                self.pending.setdefault(key, []).extend(list(done) + list(not_done))
+            try:
+                driver, request_capture = future.result()
+            except Exception as err:
+                logger.warning(f"Prewarmed driver session for {key} failed: {err}")
+            else:
+                # payloads captured and traffic caused while prewarming belong to no test user
+                del driver.requests
+                if bandwidth_meter is not None:
+                    driver.get_log('performance')
+                    bandwidth_meter.switch_driver(driver)
+                request_capture = RequestCapture(driver=driver, logger=logger, streaming=streaming_capture,
+                                                 capture_scope=capture_scope, block_media=block_media)
+                try:
+                    if validate_desktop_session(driver, self.base_url, mobile_dom_rejections, time.time(),
+                                                bandwidth_meter):
+                        return driver, request_capture
+                    logger.warning(f"Prewarmed driver session for {key} loaded the mobile DOM when it was handed "
+                                   f"over.")
+                except Exception as err:
+                    logger.warning(f"Prewarmed driver session for {key} could not open TikTok when it was handed "
+                                   f"over: {err}")
+        return self.launch_desktop_session(proxy, browser_language, streaming_capture, capture_scope,
+                                           page_load_strategy, block_media, logger=logger,
+                                           bandwidth_meter=bandwidth_meter, mobile_dom_rejections=mobile_dom_rejections)
+
+    def launch_desktop_session(self, proxy, browser_language, streaming_capture=False, capture_scope=False,
+                               page_load_strategy=None, block_media=False, leave_feed=False, logger=None,
+                               bandwidth_meter=None, mobile_dom_rejections=None):
+        """
+        Launch sessions until TikTok loads the desktop DOM, sessions with the mobile DOM are quit right away. Raises
+        RetryError if no session loaded the desktop DOM within the attempts of the retry policy.
+        :param proxy:
+        :param browser_language:
+        :param streaming_capture:
+        :param capture_scope:
+        :param page_load_strategy:
+        :param block_media:
+        :param leave_feed: open a blank page once the DOM was validated, e.g. for sessions that wait in the pool
+        :param logger: logger of the test user the session is launched for, the logger of the pool if None
+        :param bandwidth_meter: BandwidthMeter of the test user the session is launched for, None if not metered
+        :param mobile_dom_rejections: MobileDomRejections of the test user the session is launched for, whose parent
+        shall be the one of the pool, the one of the pool if None
+        :return: driver, request_capture
+        """
+        logger = logger if logger is not None else self.logger
+        mobile_dom_rejections = mobile_dom_rejections if mobile_dom_rejections is not None \
+            else self.mobile_dom_rejections
+
+        def launch_session():
+            start = time.time()
+            driver = create_driver(proxy, browser_language, capture_scope, page_load_strategy, self.headless,
+                                   streaming_capture)
+            if bandwidth_meter is not None:
+                bandwidth_meter.switch_driver(driver)
+            request_capture = RequestCapture(driver=driver, logger=logger, streaming=streaming_capture,
+                                             capture_scope=capture_scope, block_media=block_media)
+            if not validate_desktop_session(driver, self.base_url, mobile_dom_rejections, start,
+                                            bandwidth_meter):
+                return None
+            if leave_feed:
+                driver.get('about:blank')
+            return driver, request_capture
+
+        return self.retry_policy.run(launch_session, retry_on=(TimeoutException,),
+                                     accept=lambda session: session is not None)
+
+    def close(self):
+        """
+        Quit all sessions that were launched but never handed over.
+        :return:
+        """
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            futures = [future for key_futures in self.pending.values() for future in key_futures]
+            self.pending = {}
+        for future in futures:
+            if future.exception() is None:
+                driver, request_capture = future.result()
+                driver.quit()
@@ -0,0 +1,52 @@
+"""
+Extract the __NEXT_DATA__ json blob that TikTok embeds in every video page without parsing the entire page.
+"""
+
+import json
+import re
+
+from bs4 import BeautifulSoup
+
+NEXT_DATA_SCRIPT_TAG = re.compile(rb'<script[^>]*\sid=["\']?__NEXT_DATA__["\']?[^>]*>')
+SCRIPT_END_TAG = b'</script>'
+
+
+def extract_next_data_fast(html):
+    """
+    Find the __NEXT_DATA__ script tag on byte level and only parse its json content.
+    :param html: page as bytes or str
+    :return: decoded __NEXT_DATA__ json
+    """
+    if isinstance(html, str):
+        html = html.encode('utf-8')
+    script_tag = NEXT_DATA_SCRIPT_TAG.search(html)
+    if script_tag is None:
+        raise ValueError("__NEXT_DATA__ script tag not found.")
+    end = html.find(SCRIPT_END_TAG, script_tag.end())
+    if end == -1:
+        raise ValueError("__NEXT_DATA__ script tag not closed.")
+    return json.loads(html[script_tag.end():end])
+
+
+def extract_next_data_soup(html):
+    """
+    Parse the entire page with BeautifulSoup to get the __NEXT_DATA__ json.
+    :param html: page as bytes or str
+    :return: decoded __NEXT_DATA__ json
+    """
+    if isinstance(html, bytes):
+        html = html.decode('utf-8')
+    soup = BeautifulSoup(html, 'lxml')
+    return json.loads(soup.find('script', id="__NEXT_DATA__").string)
+
+
+def extract_next_data(html):
+    """
+    Return the __NEXT_DATA__ json of a page, use the byte level extractor and fall back to BeautifulSoup if it fails.
+    :param html: page as bytes or str
+    :return: decoded __NEXT_DATA__ json
+    """
+    try:
+        return extract_next_data_fast(html)
+    except (ValueError, UnicodeDecodeError):
+        return extract_next_data_soup(html)
@@ -0,0 +1,81 @@
+from collections import namedtuple
+
+IndexedPost = namedtuple("IndexedPost", field_names=("post_id", "hashtags", "author_unique_id", "music_id",
+                                                     "duration"))
+
+
+class PostIndex:
+    """
+    Index of the posts captured from api/recommend/item_list and video pages keyed by post id. Holds exactly the data
+    the bot needs to decide on actions for a post (hashtags, content creator, music, duration), such that no DOM lookup
+    is necessary while watching the post.
+    Durations are additionally kept on their own, such that durations preloaded from the database for posts whose data
+    was not captured resolve by the same lookup.
+    """
+
+    def __init__(self):
+        self.posts = {}
+        self.durations = {}
+
+    def __contains__(self, post_id):
+        return post_id in self.posts
+
+    def __len__(self):
+        return len(self.posts)
+
+    def add_post(self, post_data):
+        """
+        Add a single post in the structure of api/recommend/item_list, i.e. itemStruct, to the index.
+        :param post_data:
+        :return: IndexedPost
+        """
+        hashtags = tuple(tag.get('hashtagName') for tag in post_data.get('textExtra', [])
+                         if tag.get('hashtagName'))
+        author = post_data.get('author') or {}
+        music = post_data.get('music') or {}
+        video = post_data.get('video') or {}
+        indexed_post = IndexedPost(post_id=post_data.get('id'),
+                                   hashtags=hashtags,
+                                   author_unique_id=author.get('uniqueId'),
+                                   music_id=str(music.get('id')) if music.get('id') is not None else None,
+                                   duration=video.get('duration'))
+        self.posts[indexed_post.post_id] = indexed_post
+        if indexed_post.duration:
+            self.durations[indexed_post.post_id] = indexed_post.duration
+        return indexed_post
+
+    def add_posts(self, item_list):
+        """
+        Add all posts of an item list to the index.
+        :param item_list:
+        :return:
+        """
+        for post_data in item_list:
+            self.add_post(post_data)
+
+    def get(self, post_id):
+        """
+        Return the indexed post for a post id.
+        :param post_id:
+        :return: IndexedPost or None if post not indexed
+        """
+        return self.posts.get(post_id)
+
+    def add_durations(self, durations):
+        """
+        Add durations of posts not captured in this session, e.g. preloaded from the database. Captured durations are
+        kept.
+        :param durations: {post_id: duration in seconds}
+        :return:
+        """
+        for post_id, duration in durations.items():
+            if duration:
+                self.durations.setdefault(post_id, duration)
+
+    def get_duration(self, post_id):
+        """
+        Return the duration of a post in seconds.
+        :param post_id:
+        :return: duration or None if unknown
+        """
+        return self.durations.get(post_id)
@@ -0,0 +1,277 @@
+import json
+import queue
+import re
+import zlib
+
+import brotli
+
+from src.PostIndex import PostIndex
+
+# path and query of api/recommend/item_list (https://m.tiktok.com/api/recommend/item_list/?...), matched independently
+# of the host such that a local feed server can be used as well
+ITEM_LIST_PATH = "/api/recommend/item_list/?aid=1988&app_name=tiktok_web&device_platform=web_pc"
+
+# regular expressions of the only requests whose bodies are read by DataStoring: api/recommend/item_list and video pages
+CAPTURE_SCOPES = [
+    r'.*/api/recommend/item_list/.*',
+    r'.*/@[^/]+/video/[0-9]+.*',
+]
+# upper bound of requests kept in the request log if the capture scope is used
+REQUEST_STORAGE_MAX_SIZE = 500
+# regular expressions of video, image and font requests aborted in media blocking mode, seleniumwire only intercepts
+# requests within its scopes, thus they are added to the capture scope if both are used
+MEDIA_SCOPES = [
+    r'.*\.(mp4|webm|m3u8|ts|mp3|m4a)(\?.*)?$',
+    r'.*[?&]mime_type=video_.*',
+    r'.*\.(jpe?g|png|gif|webp|avif|heic|ico|image)(\?.*)?$',
+    r'.*\.(woff2?|ttf|otf|eot)(\?.*)?$',
+]
+# request destinations and accepted content types of media requests, for media urls without file extension
+MEDIA_FETCH_DESTINATIONS = ('video', 'audio', 'image', 'font')
+MEDIA_ACCEPT_PREFIXES = ('video/', 'audio/', 'image/', 'font/')
+MEDIA_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in MEDIA_SCOPES]
+
+
+def decode_body(body, content_encoding=None):
+    """
+    Decode a captured response body according to its Content-Encoding header. Bodies stay bytes, they are only
+    decompressed, such that json and the __NEXT_DATA__ extractor can work on them without further copies.
+    :param body: raw response body
+    :param content_encoding: value of the Content-Encoding header, e.g. "br", "gzip", "deflate" or None for identity
+    :return: decompressed body
+    """
+    if body is None or content_encoding is None:
+        return body
+    # multiple encodings are listed in the order they were applied
+    for encoding in reversed([encoding.strip().lower() for encoding in content_encoding.split(',')]):
+        if encoding in ('', 'identity'):
+            continue
+        elif encoding == 'br':
+            body = brotli.decompress(body)
+        elif encoding in ('gzip', 'x-gzip'):
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:  # raw deflate stream without zlib header
+                body = zlib.decompress(body, -zlib.MAX_WBITS)
+        else:
+            raise ValueError(f"Content-Encoding {encoding} not supported.")
+    return body
+
+
+def is_item_list_url(url):
+    """
+    :param url:
+    :return: True if url requests api/recommend/item_list of the desktop web app
+    """
+    return ITEM_LIST_PATH in url
+
+
+def is_media_request(request):
+    """
+    Check whether a request loads a video, image or font. The item_list API and page HTML are never media requests.
+    :param request: seleniumwire request
+    :return: True if request loads media
+    """
+    if is_item_list_url(request.url):
+        return False
+    if request.headers.get('Sec-Fetch-Dest') in MEDIA_FETCH_DESTINATIONS:
+        return True
+    accept = request.headers.get('Accept') or ''
+    if accept.startswith(MEDIA_ACCEPT_PREFIXES):
+        return True
+    return any(pattern.match(request.url) for pattern in MEDIA_PATTERNS)
+
+
+def decode_response(response):
+    """
+    Decode the body of a seleniumwire response according to its headers.
+    :param response:
+    :return: decompressed body
+    """
+    return decode_body(response.body, response.headers.get('Content-Encoding'))
+
+
+class RequestCapture:
+    """
+    Shared capture of the responses of the current driver session. Every api/recommend/item_list response is only
+    parsed once, all consumers (DataStoring, WebHelper) read the decoded posts from here instead of walking
+    driver.requests again.
+    A seleniumwire response interceptor hands over item lists and video pages through a queue as soon as they arrive,
+    thus the request log is never walked. In streaming mode they are already decoded in the proxy thread and the
+    consumed requests are removed from the request log, which is kept in memory and bounded.
+    With capture scope only the requests listed in CAPTURE_SCOPES are kept in the request log and entries are removed
+    from the log as soon as they have been read.
+    With media blocking a seleniumwire request interceptor aborts all video, image and font requests before they reach
+    the proxy, only feed metadata is loaded.
+    :param driver: seleniumwire webdriver whose requests shall be read
+    :param logger: logger of the current test user
+    :param streaming: decode responses in the proxy thread and remove consumed requests from the request log
+    :param capture_scope: only capture requests DataStoring reads and drop them once read
+    :param block_media: abort video, image and font requests
+    """
+
+    def __init__(self, driver, logger, streaming=False, capture_scope=False, block_media=False):
+        self.driver = driver
+        self.logger = logger
+        self.streaming = streaming
+        self.capture_scope = capture_scope
+        self.block_media = block_media
+        self.blocked_media_requests = 0
+        self.item_lists = []
+        self.posts = {}
+        self.post_index = PostIndex()
+        self.expected_pages = set()
+        self.pages = {}
+        self.payload_queue = queue.Queue()
+        if self.driver is None:  # nothing to capture from, e.g. replayed sessions
+            return
+        if self.capture_scope:
+            self.driver.scopes = CAPTURE_SCOPES + MEDIA_SCOPES if self.block_media else CAPTURE_SCOPES
+        self.driver.response_interceptor = self.intercept_response
+        if self.block_media:
+            self.driver.request_interceptor = self.intercept_request
+
+    def intercept_request(self, request):
+        """
+        Request interceptor called by seleniumwire for every request, runs in the proxy thread. Media requests are
+        aborted without being sent upstream.
+        :param request:
+        :return:
+        """
+        if is_media_request(request):
+            self.blocked_media_requests += 1
+            request.abort()
+
+    def intercept_response(self, request, response):
+        """
+        Response interceptor called by seleniumwire for every response, runs in the proxy thread. Responses of item
+        lists and expected video pages are put into the payload queue, in streaming mode already decoded.
+        :param request:
+        :param response:
+        :return:
+        """
+        if not is_item_list_url(request.url) and request.url not in self.expected_pages:
+            return
+        if not self.streaming:
+            self.payload_queue.put(('response', request.url, request))
+            return
+        try:
+            if is_item_list_url(request.url) and response.body is not None and len(response.body) > 0:
+                self.payload_queue.put(('item_list', request.url, json.loads(decode_response(response))['itemList']))
+            elif request.url in self.expected_pages:
+                self.payload_queue.put(('page', request.url, decode_response(response)))
+        except Exception as err:
+            self.logger.warning(f"Captured response of {request.url} could not be decoded: {err}")
+
+    def update(self):
+        """
+        Read all payloads that arrived since the last update. The request log is not walked, the response interceptor
+        hands over the responses that are read, thus an update only costs as much as what arrived since the last one.
+        :return: list of item lists that were decoded during this update
+        """
+        new_item_lists = []
+        consumed_urls = set()
+        while True:
+            try:
+                payload_type, url, payload = self.payload_queue.get_nowait()
+            except queue.Empty:
+                break
+            consumed_urls.add(url)
+            if payload_type == 'item_list':
+                new_item_lists.append(self.add_item_list(payload))
+            elif payload_type == 'page':
+                self.pages[url] = payload
+            else:
+                item_list = self.read_response(payload)
+                if item_list is not None:
+                    new_item_lists.append(item_list)
+        # payloads were handed over, thus the request log does not need to keep their bodies anymore
+        if (self.streaming or self.capture_scope) and len(consumed_urls) > 0:
+            self.drop_consumed_requests(consumed_urls)
+        return new_item_lists
+
+    def read_response(self, request):
+        """
+        Decode a response handed over by the response interceptor outside of streaming mode.
+        :param request: seleniumwire request with its response
+        :return: item list if the response was a non-empty item list, else None
+        """
+        if not is_item_list_url(request.url):
+            try:
+                self.pages[request.url] = decode_response(request.response)
+            except Exception as err:
+                self.logger.warning(f"Captured response of {request.url} could not be decoded: {err}")
+            return None
+        if request.response.body is None or len(request.response.body) == 0:
+            return None
+        return self.add_item_list(json.loads(decode_response(request.response))['itemList'], request=request)
+
+    def drop_consumed_requests(self, urls):
+        """
+        Remove requests that were read from the request log, requests not read yet stay in it. seleniumwire has no
+        public call to remove single requests, thus this is only done for its in-memory storage, which the capture
+        scope and streaming capture use. Requests of other storages are left to the bound of the request log.
+        :param urls: urls of the requests that were read
+        :return:
+        """
+        storage = self.driver.backend.storage
+        if not hasattr(storage, '_requests'):
+            return
+        with storage._lock:
+            for request_id in [request_id for request_id, entry in storage._requests.items()
+                               if entry.get('request').url in urls]:
+                del storage._requests[request_id]
+
+    def add_item_list(self, item_list, request=None):
+        """
+        Register a decoded item list and add its posts to the posts dictionary keyed by post id.
+        :param item_list: list of post data as provided by api/recommend/item_list
+        :param request: request the item list was taken from, if any
+        :return: item list
+        """
+        self.item_lists.append({'request': request, 'request_body': item_list})
+        for post in item_list:
+            self.posts[post.get('id')] = post
+        self.post_index.add_posts(item_list)
+        return item_list
+
+    def get_item_lists(self):
+        """
+        Return all item lists captured so far in the order they were received.
+        :return: [{request: , request_body: }]
+        """
+        self.update()
+        return self.item_lists
+
+    def get_post(self, post_id):
+        """
+        Return the decoded data of a post, if captured.
+        :param post_id:
+        :return: post data or None
+        """
+        if post_id not in self.posts:
+            self.update()
+        return self.posts.get(post_id)
+
+    def expect_page(self, url):
+        """
+        Register the url of a page whose response body shall be captured, e.g. a video page opened on a separate tab.
+        :param url:
+        :return:
+        """
+        self.expected_pages.add(url)
+
+    def get_page_body(self, url):
+        """
+        Return and release the captured and decoded response body of an expected page.
+        :param url:
+        :return: response body or None if not captured (yet) or not decodable
+        """
+        if url not in self.pages:
+            self.update()
+        body = self.pages.pop(url, None)
+        if body is not None:
+            self.expected_pages.discard(url)
+        return body
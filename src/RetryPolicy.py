@@ -0,0 +1,73 @@
+import time
+
+
+class RetryError(Exception):
+    """
+    Raised when an operation did not succeed within the attempts or the deadline of its retry policy.
+    :param message:
+    :param last_error: exception raised by the last attempt, None if the last attempt returned an unaccepted result
+    """
+
+    def __init__(self, message, last_error=None):
+        super().__init__(message)
+        self.last_error = last_error
+
+
+class RetryPolicy:
+    """
+    Bounded retries with exponential backoff. An operation is attempted at most max_attempts times and no new attempt is
+    started once the deadline would be exceeded by the next backoff, thus the worst case latency of a stalled operation
+    is max(deadline, duration of the attempts) instead of unbounded.
+    :param max_attempts: number of attempts including the first one
+    :param initial_backoff: seconds to wait before the second attempt
+    :param backoff_factor: factor the backoff grows by with every further attempt
+    :param max_backoff: ceiling in seconds of a single backoff
+    :param deadline: seconds after the first attempt after which no further attempt is started, None for no deadline
+    """
+
+    def __init__(self, max_attempts=5, initial_backoff=0.5, backoff_factor=2, max_backoff=10, deadline=120):
+        if max_attempts < 1:
+            raise ValueError("A retry policy needs at least one attempt.")
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+
+    def backoff(self, attempt):
+        """
+        :param attempt: number of the attempt that failed, starting at 1
+        :return: seconds to wait before the next attempt
+        """
+        return min(self.initial_backoff * self.backoff_factor ** (attempt - 1), self.max_backoff)
+
+    def run(self, operation, retry_on=(Exception,), accept=None, on_retry=None, sleep=time.sleep):
+        """
+        Attempt operation until it succeeds. An attempt fails if it raises one of retry_on or if accept rejects its
+        result, any other exception is raised right away.
+        :param operation: callable without arguments
+        :param retry_on: exception types that lead to another attempt
+        :param accept: callable taking the result of an attempt, returning True if the result is final
+        :param on_retry: callable taking the failed attempt number and the exception (or None), called before the
+        backoff, e.g. to reload the page or to switch the proxy
+        :param sleep: callable waiting the given seconds, e.g. WaitBudget.sleep for accounted waiting
+        :return: result of the successful attempt
+        """
+        start = time.time()
+        for attempt in range(1, self.max_attempts + 1):
+            error = None
+            try:
+                result = operation()
+                if accept is None or accept(result):
+                    return result
+            except retry_on as err:
+                error = err
+            if attempt == self.max_attempts:
+                break
+            backoff = self.backoff(attempt)
+            if self.deadline is not None and time.time() - start + backoff > self.deadline:
+                raise RetryError(f"Deadline of {self.deadline} seconds reached after {attempt} attempts.", error)
+            if on_retry is not None:
+                on_retry(attempt, error)
+            sleep(backoff)
+        raise RetryError(f"No success after {self.max_attempts} attempts.", error)
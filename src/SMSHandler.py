@@ -6,14 +6,25 @@ from twilio.twiml.messaging_response import MessagingResponse
 import os
 from twilio.rest import Client
 
+from src.RetryPolicy import RetryError, RetryPolicy
+
+# Twilio may take a while to deliver the SMS, the newest SMS is fetched again after at least 10 seconds before a new
+# code is requested
+SMS_RETRY_POLICY = RetryPolicy(max_attempts=4, initial_backoff=10, backoff_factor=1.5, max_backoff=30, deadline=180)
+
+
 class SMSHandler:
     """
     Using the mobile phone service Twilio through their API this class allows to create new phone number for a specific
     country, receive all SMS from specific phone number, receive newest SMS from specific phone number, filter out
     verification code from a SMS
+    :param database:
+    :param retry_policy: RetryPolicy bounding how often the newest SMS is fetched again if its code is outdated,
+    SMS_RETRY_POLICY if None
     """
-    def __init__(self, database):
+    def __init__(self, database, retry_policy=None):
         self.database = database
+        self.retry_policy = retry_policy if retry_policy is not None else SMS_RETRY_POLICY
         account_sid = 'PLACEHOLDER ACCOUNT_SID'
         auth_token = 'PLACEHOLDER AUTH_TOKEN'
         self.client = Client(account_sid, auth_token)
@@ -62,7 +73,23 @@ class SMSHandler:
         :param test_user_id:
         :param phone_number_country_prefix_numerous:
         :param phone_number:
-        :return:
+        :return: verification code or "Trigger Resend" if no new code received
+        """
+        try:
+            return self.retry_policy.run(
+                lambda: self.fetch_verification_code(test_user_id, phone_number, phone_number_country_prefix_numerous),
+                retry_on=(), accept=lambda verification_code: verification_code is not None)
+        except RetryError as e:
+            print(f"Error: no new verification code received for {test_user_id}, resend code. {e}")
+            return "Trigger Resend"
+
+    def fetch_verification_code(self, test_user_id, phone_number, phone_number_country_prefix_numerous):
+        """
+        Fetch the newest SMS once and extract its verification code.
+        :param test_user_id:
+        :param phone_number:
+        :param phone_number_country_prefix_numerous:
+        :return: verification code, "Trigger Resend" if SMS holds no code or None if code is the previous one
         """
         newest_message = self.get_newest_sms_body(phone_number, phone_number_country_prefix_numerous)
 
@@ -89,12 +116,8 @@ class SMSHandler:
         # check if verification different to previous one
         previous_code = self.database.get_previous_verification_code(test_user_id=test_user_id)
         if int(verification_code) == previous_code:
-            print(f"Verification code {verification_code} seems to be too old for {test_user_id}, "
-                  f"fetching again in 10secs.")
-            time.sleep(10)
-            self.get_verification_code(test_user_id=test_user_id,
-                                       phone_number=phone_number,
-                                       phone_number_country_prefix_numerous=phone_number_country_prefix_numerous)
+            print(f"Verification code {verification_code} seems to be too old for {test_user_id}, fetching again.")
+            return None
         else:
             self.database.update_verification_code(verification_code=verification_code,
                                                    test_user_id=test_user_id)
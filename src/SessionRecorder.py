@@ -0,0 +1,132 @@
+import base64
+import gzip
+import json
+import time
+from pathlib import Path
+
+from src.RequestCapture import RequestCapture
+from src.Tracer import Tracer
+
+
+class SessionRecorder:
+    """
+    Compressed archive (gzip, one JSON record per line) of everything DataStoring consumes during a run: the item lists
+    of api/recommend/item_list, the HTML of the video pages of separate posts and, at the end of the session, the final
+    post_batch_positions together with the actions performed. The archive can be fed through DataStoring again by
+    SessionReplay without browser or network.
+    :param file_path: path of the archive, e.g. session_<test run>_user_<test user>.jsonl.gz
+    :param test_user_id:
+    :param test_run_id:
+    """
+
+    def __init__(self, file_path, test_user_id, test_run_id):
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        self.file = gzip.open(file_path, 'wt', encoding='utf-8')
+        self.write({'type': 'header', 'test_user_id': test_user_id, 'test_run_id': test_run_id, 'time': time.time()})
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+
+    def record_item_list(self, item_list):
+        """
+        :param item_list: decoded item list of api/recommend/item_list
+        :return:
+        """
+        self.write({'type': 'item_list', 'item_list': item_list})
+
+    def record_page(self, url, body):
+        """
+        :param url: url of the video page
+        :param body: decoded response body as bytes
+        :return:
+        """
+        self.write({'type': 'page', 'url': url, 'body': base64.b64encode(body).decode('ascii')})
+
+    def record_session_end(self, helper):
+        """
+        Record the final post and batch positions and the actions performed by the test user.
+        :param helper: WebHelper of the session
+        :return:
+        """
+        self.write({'type': 'session_end',
+                    'post_batch_positions': helper.post_batch_positions,
+                    'posts_liked': list(helper.posts_liked),
+                    'creators_followed': list(helper.creators_followed),
+                    'posts_watched_longer': helper.posts_watched_longer,
+                    'time_to_look_at_post_action': helper.time_to_look_at_post_action})
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_session_archive(file_path):
+    """
+    :param file_path: archive written by SessionRecorder
+    :return: list of records in the order they were recorded
+    """
+    with gzip.open(file_path, 'rt', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+class ReplayCapture(RequestCapture):
+    """
+    RequestCapture holding the recorded item lists, there is no request log to read from.
+    """
+
+    def __init__(self, logger):
+        super().__init__(driver=None, logger=logger)
+
+    def update(self):
+        return []
+
+
+class SessionReplay:
+    """
+    Stands in for the WebHelper of a recorded session, such that DataStoring can ingest the archive of a run. Post and
+    batch positions are the final ones of the recorded session, thus they are not updated while replaying.
+    :param file_path: archive written by SessionRecorder
+    :param logger:
+    :param tracer: Tracer recording the spans of the ingest path, spans are not written if None
+    """
+
+    def __init__(self, file_path, logger, tracer=None):
+        self.records = read_session_archive(file_path)
+        header = self.records[0] if len(self.records) > 0 and self.records[0].get('type') == 'header' else {}
+        session_end = next((record for record in self.records if record.get('type') == 'session_end'), None)
+        if session_end is None:
+            raise Exception(f"Archive {file_path} ends before the session was completed.")
+        self.logger = logger
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.test_user_id = header.get('test_user_id')
+        self.test_run_id = header.get('test_run_id')
+        self.driver = None
+        self.request_capture = ReplayCapture(logger=logger)
+        self.current_post_id = None
+        self.post_batch_positions = session_end.get('post_batch_positions')
+        self.posts_liked = session_end.get('posts_liked')
+        self.creators_followed = session_end.get('creators_followed')
+        self.posts_watched_longer = session_end.get('posts_watched_longer')
+        self.time_to_look_at_post_action = session_end.get('time_to_look_at_post_action')
+
+    def update_post_and_batch_positions(self, optional_batch_position=None):
+        pass
+
+    def close_driver(self):
+        pass
+
+    def replay(self, data_storing):
+        """
+        Feed the recorded pages and item lists through DataStoring in the order they were consumed and store the
+        collected data.
+        :param data_storing: DataStoring created with this replay as helper
+        :return:
+        """
+        for record in self.records:
+            if record.get('type') == 'page':
+                data_storing.store_separate_post_data(body=base64.b64decode(record.get('body')), url=record.get('url'))
+            elif record.get('type') == 'item_list':
+                self.request_capture.add_item_list(record.get('item_list'))
+                data_storing.store_data_if_visible(request_data=record.get('item_list'))
+        data_storing.store_collected_data()
@@ -0,0 +1,304 @@
+import multiprocessing
+import queue
+import time
+import traceback
+from collections import deque
+
+
+def run_worker(worker_index, inbox, outbox, run_session, on_worker_exit=None):
+    """
+    Loop of a worker process: run the test sets sent to its inbox one after another until None is received. A worker
+    stops after a failed session, such that the next session does not inherit a broken browser or proxy state.
+    :param worker_index:
+    :param inbox: queue of (test set, test set the worker runs next or None) for this worker
+    :param outbox: queue shared by all workers to report results to the scheduler
+    :param run_session: callable taking a test set and the test set the worker runs next, returning the results of the
+    first, e.g. ParalleliseTesting.run_test, which prewarms the session of the next one
+    :param on_worker_exit: callable without arguments called before the worker stops, e.g. to close its driver pool
+    :return:
+    """
+    try:
+        while True:
+            message = inbox.get()
+            if message is None:
+                break
+            test_data, next_test_data = message
+            try:
+                outbox.put(('done', worker_index, run_session(test_data, next_test_data)))
+            except Exception:
+                outbox.put(('failed', worker_index, traceback.format_exc()))
+                break
+    finally:
+        if on_worker_exit is not None:
+            on_worker_exit()
+
+
+class SessionScheduler:
+    """
+    Runs test sets as a job queue on a fixed number of worker processes. A test set is handed to the next idle worker,
+    its result is handed to on_result as soon as its session finished, independent of the sessions still running.
+    Failed sessions, including sessions of crashed workers, are put back at the end of the queue until max_attempts is
+    reached, the other sessions of the test run are not affected.
+    When a worker gets a test set, the next pending test set with the same proxy host, or else the same proxy country,
+    is reserved for that worker and handed over with it. The worker can then prewarm that session while the current
+    one runs. A reservation is released to the front of the queue if its worker stops, as the prewarmed session is
+    lost with the worker's process.
+    :param run_session: module level callable taking a test set and the test set reserved to run next on the same
+    worker (or None) and returning the results of the first, it is called in the worker processes, thus it must be
+    picklable
+    :param number_of_sessions: number of sessions, i.e. browsers, running at the same time
+    :param max_attempts: number of attempts per test set including the first one
+    :param on_worker_exit: module level callable without arguments called in a worker process before it stops
+    :param poll_interval: seconds to wait for a result before checking whether workers crashed
+    :param max_sessions_per_country: number of sessions whose proxy is located in the same country running at the same
+    time, sessions of one Webshare country pool get flagged together, None for no limit
+    :param max_sessions_per_host: number of sessions using the same proxy host running at the same time, None for no
+    limit
+    :param launch_stagger: minimum seconds between two session launches, such that Chrome starts one after another
+    instead of all at once
+    """
+
+    def __init__(self, run_session, number_of_sessions, max_attempts=2, on_worker_exit=None, poll_interval=5,
+                 max_sessions_per_country=None, max_sessions_per_host=None, launch_stagger=0):
+        if number_of_sessions < 1:
+            raise ValueError("At least one session has to run at a time.")
+        if (max_sessions_per_country is not None and max_sessions_per_country < 1) or \
+                (max_sessions_per_host is not None and max_sessions_per_host < 1):
+            raise ValueError("Limits per proxy country and host have to allow at least one session.")
+        self.run_session = run_session
+        self.number_of_sessions = number_of_sessions
+        self.max_attempts = max_attempts
+        self.on_worker_exit = on_worker_exit
+        self.poll_interval = poll_interval
+        self.max_sessions_per_country = max_sessions_per_country
+        self.max_sessions_per_host = max_sessions_per_host
+        self.launch_stagger = launch_stagger
+        self.last_launch = None
+        self.outbox = multiprocessing.Queue()
+        self.workers = {}
+        self.inboxes = {}
+        self.running = {}
+        self.attempts = {}
+        self.reserved = {}
+        self.failed = []
+
+    def start_worker(self, worker_index):
+        self.inboxes[worker_index] = multiprocessing.Queue()
+        self.workers[worker_index] = multiprocessing.Process(
+            target=run_worker, args=(worker_index, self.inboxes[worker_index], self.outbox, self.run_session,
+                                     self.on_worker_exit), daemon=True)
+        self.workers[worker_index].start()
+
+    def run(self, tests, on_result=None, on_failure=None):
+        """
+        Run all test sets and return once every test set either succeeded or failed max_attempts times.
+        :param tests: list of test sets
+        :param on_result: callable taking the results of a session, called in this process as soon as it finished
+        :param on_failure: callable taking a test set and the traceback of its last attempt, called once the test set
+        failed max_attempts times
+        :return: list of results in the order the sessions finished
+        """
+        pending = deque(tests)
+        results = []
+        try:
+            while len(pending) > 0 or len(self.running) > 0 or len(self.reserved) > 0:
+                self.dispatch(pending)
+                try:
+                    message = self.outbox.get(timeout=self.next_poll_timeout(pending))
+                except queue.Empty:
+                    self.handle_crashed_workers(pending, results, on_result, on_failure)
+                    continue
+                self.handle_message(message, pending, results, on_result, on_failure)
+        finally:
+            self.stop()
+        return results
+
+    def handle_message(self, message, pending, results, on_result, on_failure):
+        """
+        Handle the report of a worker about its session.
+        :param message: (status, worker index, results or traceback)
+        :param pending:
+        :param results:
+        :param on_result:
+        :param on_failure:
+        :return:
+        """
+        status, worker_index, payload = message
+        test_data = self.running.pop(worker_index)
+        if status == 'done':
+            results.append(payload)
+            if on_result is not None:
+                on_result(payload)
+        else:
+            # worker stops after a failed session, a new one takes its place with the next dispatch
+            self.workers.pop(worker_index).join()
+            self.release_reservation(worker_index, pending)
+            self.handle_failure(test_data, payload, pending, on_failure)
+
+    def dispatch(self, pending):
+        """
+        Hand pending test sets to idle workers, starting workers where necessary. An idle worker runs the test set
+        reserved for it first. A test set is skipped for now if it would exceed the concurrency limit of its proxy
+        country or host, the next admissible one is launched instead. Only one session is launched per launch stagger.
+        Every test set is handed over together with the test set reserved to run next on the same worker.
+        :param pending: queue of test sets not yet running
+        :return:
+        """
+        dispatched = []
+        for worker_index in range(self.number_of_sessions):
+            if (len(pending) == 0 and len(self.reserved) == 0) or self.seconds_until_next_launch() > 0:
+                break
+            if worker_index in self.running:
+                continue
+            test_data = self.reserved.pop(worker_index, None)
+            if test_data is not None and not self.is_admissible(test_data):
+                pending.appendleft(test_data)
+                test_data = None
+            if test_data is None:
+                test_data = next((test for test in pending if self.is_admissible(test)), None)
+                if test_data is None:
+                    continue
+                pending.remove(test_data)
+            if worker_index not in self.workers:
+                self.start_worker(worker_index)
+            self.running[worker_index] = test_data
+            self.attempts[test_data.get('test_user_id')] = self.attempts.get(test_data.get('test_user_id'), 0) + 1
+            # the session knows whether an earlier attempt of its test set may have left data behind
+            test_data['attempt'] = self.attempts.get(test_data.get('test_user_id'))
+            self.last_launch = time.time()
+            dispatched.append(worker_index)
+        # reserved only once all idle workers got a test set, such that no reservation keeps an idle worker waiting
+        for worker_index in dispatched:
+            self.inboxes[worker_index].put((self.running[worker_index], self.reserve_next(worker_index, pending)))
+
+    def reserve_next(self, worker_index, pending):
+        """
+        Reserve the next pending test set using the same proxy host, or else the same proxy country, as the session a
+        worker was just handed, such that the worker can prewarm its session.
+        :param worker_index:
+        :param pending:
+        :return: reserved test set or None
+        """
+        proxy = self.running[worker_index].get('proxy') or {}
+        pending_proxies = [(test, test.get('proxy') or {}) for test in pending]
+        candidates = [test for test, test_proxy in pending_proxies
+                      if test_proxy.get('proxy_host') == proxy.get('proxy_host')]
+        if len(candidates) == 0 and proxy.get('country') is not None:
+            candidates = [test for test, test_proxy in pending_proxies
+                          if test_proxy.get('country') == proxy.get('country')]
+        if len(candidates) == 0:
+            return None
+        pending.remove(candidates[0])
+        self.reserved[worker_index] = candidates[0]
+        return candidates[0]
+
+    def release_reservation(self, worker_index, pending):
+        """
+        Put the test set reserved for a worker that stopped back at the front of the queue.
+        :param worker_index:
+        :param pending:
+        :return:
+        """
+        test_data = self.reserved.pop(worker_index, None)
+        if test_data is not None:
+            pending.appendleft(test_data)
+
+    def is_admissible(self, test_data):
+        """
+        Check whether a test set can be launched without exceeding the concurrency limits of its proxy.
+        :param test_data:
+        :return: True if the limits of its proxy country and host allow another session
+        """
+        proxy = test_data.get('proxy')
+        if proxy is None:
+            return True
+        running_proxies = [test.get('proxy') for test in self.running.values() if test.get('proxy') is not None]
+        if self.max_sessions_per_country is not None and proxy.get('country') is not None and \
+                sum(running.get('country') == proxy.get('country') for running in running_proxies) \
+                >= self.max_sessions_per_country:
+            return False
+        if self.max_sessions_per_host is not None and \
+                sum(running.get('proxy_host') == proxy.get('proxy_host') for running in running_proxies) \
+                >= self.max_sessions_per_host:
+            return False
+        return True
+
+    def seconds_until_next_launch(self):
+        """
+        :return: seconds until the launch stagger allows the next session to be launched, 0 if it may be launched now
+        """
+        if self.last_launch is None:
+            return 0
+        return max(0.0, self.launch_stagger - (time.time() - self.last_launch))
+
+    def next_poll_timeout(self, pending):
+        """
+        Seconds to wait for the next report of a worker. If test sets are only held back by the launch stagger, the
+        wait ends when the next launch is due.
+        :param pending:
+        :return:
+        """
+        if len(pending) + len(self.reserved) > 0 and len(self.running) < self.number_of_sessions and \
+                self.seconds_until_next_launch() > 0:
+            return min(self.poll_interval, self.seconds_until_next_launch())
+        return self.poll_interval
+
+    def handle_crashed_workers(self, pending, results, on_result, on_failure):
+        """
+        Treat the sessions of worker processes that died without reporting, e.g. killed for running out of memory, as
+        failed. Reports a worker sent right before it stopped are handled first.
+        :param pending:
+        :param results:
+        :param on_result:
+        :param on_failure:
+        :return:
+        """
+        stopped = [worker_index for worker_index, worker in self.workers.items() if not worker.is_alive()]
+        if len(stopped) == 0:
+            return
+        while True:
+            try:
+                message = self.outbox.get_nowait()
+            except queue.Empty:
+                break
+            self.handle_message(message, pending, results, on_result, on_failure)
+        for worker_index in stopped:
+            worker = self.workers.pop(worker_index, None)
+            test_data = self.running.pop(worker_index, None)
+            self.release_reservation(worker_index, pending)
+            if worker is not None and test_data is not None:
+                self.handle_failure(test_data, f"Worker process exited with code {worker.exitcode}.", pending,
+                                    on_failure)
+
+    def handle_failure(self, test_data, error, pending, on_failure):
+        """
+        Put a failed test set back at the end of the queue or give up on it after max_attempts.
+        :param test_data:
+        :param error: traceback or reason of the failure
+        :param pending:
+        :param on_failure:
+        :return:
+        """
+        test_user_id = test_data.get('test_user_id')
+        if self.attempts.get(test_user_id) < self.max_attempts:
+            print(f"Session of test user {test_user_id} failed in attempt {self.attempts.get(test_user_id)}, "
+                  f"queued again:\n{error}")
+            pending.append(test_data)
+        else:
+            print(f"Session of test user {test_user_id} failed {self.attempts.get(test_user_id)} times, giving up:\n"
+                  f"{error}")
+            self.failed.append(test_data)
+            if on_failure is not None:
+                on_failure(test_data, error)
+
+    def stop(self):
+        """
+        Let all workers finish their current session and stop.
+        :return:
+        """
+        for worker_index, worker in self.workers.items():
+            if worker.is_alive():
+                self.inboxes[worker_index].put(None)
+        for worker in self.workers.values():
+            worker.join()
+        self.workers = {}
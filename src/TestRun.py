@@ -1,4 +1,6 @@
 
+from psycopg2.extras import Json
+
 from src.DatabaseHelper import *
 
 
@@ -20,6 +22,7 @@ class TestRun:
 
     def __init__(self, test_data):
         self.test_run_id = None
+        self.bandwidth_columns = None
         self.database = DatabaseHelper()
         self.test_data = test_data
         self.create_test_run()
@@ -81,17 +84,52 @@ class TestRun:
             print(error)
             raise Exception("Test run could not be created.")
 
-    def store_test_duration(self, duration, test_user_id):
+    def has_bandwidth_columns(self):
+        """
+        Check once whether the table testrun has the columns request_bytes, response_bytes and bandwidth, which have to
+        be added to databases created before bandwidth was measured:
+        alter table testrun add column if not exists request_bytes bigint,
+                            add column if not exists response_bytes bigint,
+                            add column if not exists bandwidth jsonb;
+        :return: True if all three columns exist
+        """
+        if self.bandwidth_columns is None:
+            self.database.cur.execute("""
+                select count(*) from information_schema.columns
+                where table_name = 'testrun' and column_name in ('request_bytes', 'response_bytes', 'bandwidth')""")
+            self.bandwidth_columns = self.database.cur.fetchone()[0] == 3
+            if not self.bandwidth_columns:
+                print(f"Table testrun has no bandwidth columns, only durations are stored for test run "
+                      f"{self.test_run_id}.")
+        return self.bandwidth_columns
+
+    def store_test_duration(self, duration, test_user_id, bandwidth=None):
+        """
+        Store duration and, if measured, the bytes transferred by the driver session of a test user. The bytes are only
+        stored if the table testrun has the columns for them.
+        :param duration: in minutes
+        :param test_user_id:
+        :param bandwidth: report of BandwidthMeter or None
+        :return:
+        """
         try:
-            sql = """update testrun 
-            set duration = (%s) where id = (%s) and testuserid = (%s)"""
-            self.database.cur.execute(sql, (duration, self.test_run_id, test_user_id))
+            if bandwidth is None or not self.has_bandwidth_columns():
+                sql = """update testrun 
+                set duration = (%s) where id = (%s) and testuserid = (%s)"""
+                self.database.cur.execute(sql, (duration, self.test_run_id, test_user_id))
+            else:
+                sql = """update testrun 
+                set duration = (%s), request_bytes = (%s), response_bytes = (%s), bandwidth = (%s) 
+                where id = (%s) and testuserid = (%s)"""
+                self.database.cur.execute(sql, (duration, bandwidth.get('request_bytes'),
+                                                bandwidth.get('response_bytes'), Json(bandwidth), self.test_run_id,
+                                                test_user_id))
             self.database.conn.commit()
         except (psycopg2.InterfaceError, psycopg2.OperationalError) as cursor_error:
             print(cursor_error)
             print("Instantiating db connection and trying to store test run data again.")
             self.database = DatabaseHelper()
-            self.store_test_duration(duration, test_user_id)
+            self.store_test_duration(duration, test_user_id, bandwidth)
         except (Exception, psycopg2.DatabaseError) as error:
             print(error)
-            raise Exception("Post data could not be stored")
+            raise Exception("Test duration could not be stored")
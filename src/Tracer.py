@@ -0,0 +1,88 @@
+import contextlib
+import functools
+import json
+import time
+from pathlib import Path
+
+
+class Tracer:
+    """
+    Lightweight span tracing of a test user's run. Every finished span is appended as one JSON line to the trace file,
+    such that traces of several runs can be summarised with Testing/TraceSummary.py. Without a file path spans are
+    timed but not written.
+    :param file_path: path of the JSONL trace file or None
+    :param test_user_id:
+    :param test_run_id:
+    """
+
+    def __init__(self, file_path=None, test_user_id=None, test_run_id=None):
+        self.file = None
+        self.test_user_id = test_user_id
+        self.test_run_id = test_run_id
+        self.depth = 0
+        if file_path is not None:
+            Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(file_path, 'a')
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """
+        Time the enclosed block and write it as span to the trace.
+        :param name: name of the span, e.g. the method traced
+        :param attributes: additional values stored with the span, e.g. batch and feed position
+        :return:
+        """
+        start = time.time()
+        self.depth += 1
+        error = None
+        try:
+            yield
+        except Exception as err:
+            error = type(err).__name__
+            raise
+        finally:
+            self.depth -= 1
+            if error is not None:
+                attributes['error'] = error
+            self.record(name, start, time.time() - start, **attributes)
+
+    def record(self, name, start, seconds, **attributes):
+        """
+        Write a span that was timed outside of the tracer to the trace, e.g. a session rejected by the driver pool.
+        :param name: name of the span
+        :param start: time the span started
+        :param seconds: duration of the span
+        :param attributes: additional values stored with the span
+        :return:
+        """
+        if self.file is not None:
+            record = {'name': name, 'start': round(start, 3), 'seconds': round(seconds, 6), 'depth': self.depth,
+                      'test_user_id': self.test_user_id, 'test_run_id': self.test_run_id}
+            record.update(attributes)
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def traced(span_name):
+    """
+    Decorator tracing every call of a method as span, the instance needs a tracer attribute. Batch and post position of
+    the instance are stored with the span if available, the post position as feed_position as it counts the posts of
+    the entire run as stored in the database, not the posts within the batch.
+    :param span_name:
+    :return:
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            attributes = {name: getattr(self, key)
+                          for name, key in (('batch', 'batch'), ('feed_position', 'post_position'))
+                          if isinstance(getattr(self, key, None), int)}
+            with self.tracer.span(span_name, **attributes):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,77 @@
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.wait import WebDriverWait
+
+
+def document_ready(driver):
+    """
+    Condition for WebDriverWait: page finished loading.
+    :param driver:
+    :return:
+    """
+    return driver.execute_script("return document.readyState") == 'complete'
+
+
+class WaitBudget:
+    """
+    Explicit condition waits with a ceiling, recording the time spent waiting per call site such that the total waiting
+    time of a run can be reported at its end.
+    """
+
+    def __init__(self):
+        self.seconds_per_call_site = {}
+        self.waits_per_call_site = {}
+
+    def record(self, call_site, seconds):
+        """
+        Add time spent waiting to a call site.
+        :param call_site: name of the method waiting
+        :param seconds:
+        :return:
+        """
+        self.seconds_per_call_site[call_site] = self.seconds_per_call_site.get(call_site, 0) + seconds
+        self.waits_per_call_site[call_site] = self.waits_per_call_site.get(call_site, 0) + 1
+
+    def until(self, driver, call_site, condition, timeout, poll_frequency=0.2, raise_on_timeout=False):
+        """
+        Wait until condition is met, but at most timeout seconds.
+        :param driver:
+        :param call_site: name of the method waiting
+        :param condition: expected condition or callable taking the driver
+        :param timeout: ceiling in seconds
+        :param poll_frequency:
+        :param raise_on_timeout: raise TimeoutException if ceiling reached, otherwise return False
+        :return: return value of condition or False if ceiling reached
+        """
+        start = time.time()
+        try:
+            return WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(condition)
+        except TimeoutException:
+            if raise_on_timeout:
+                raise
+            return False
+        finally:
+            self.record(call_site, time.time() - start)
+
+    def sleep(self, call_site, seconds):
+        """
+        Fixed sleep that is still accounted for, e.g. to mimic human behaviour.
+        :param call_site: name of the method waiting
+        :param seconds:
+        :return:
+        """
+        start = time.time()
+        time.sleep(seconds)
+        self.record(call_site, time.time() - start)
+
+    def report(self):
+        """
+        Report of the time spent waiting, sorted by call site with the longest total waiting time first.
+        :return: {total_seconds: , call_sites: {call_site: {seconds: , waits: }}}
+        """
+        call_sites = {}
+        for call_site in sorted(self.seconds_per_call_site, key=self.seconds_per_call_site.get, reverse=True):
+            call_sites[call_site] = {'seconds': round(self.seconds_per_call_site.get(call_site), 3),
+                                     'waits': self.waits_per_call_site.get(call_site)}
+        return {'total_seconds': round(sum(self.seconds_per_call_site.values()), 3), 'call_sites': call_sites}
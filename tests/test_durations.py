@@ -0,0 +1,60 @@
+# durations preloaded from the database have to resolve for the post ids read from the feed
+# usage: python -m unittest discover tests
+
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.PostIndex import PostIndex
+
+try:
+    from src.DatabaseHelper import DatabaseHelper
+except ImportError:  # psycopg2 or langdetect not installed
+    DatabaseHelper = None
+
+
+class FakeCursor:
+    """
+    Cursor returning the rows of the table posts as psycopg2 does, i.e. ids as int as the column is a bigint.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, sql, parameters=None):
+        self.executed.append((sql, parameters))
+
+    def fetchall(self):
+        return self.rows
+
+
+@unittest.skipIf(DatabaseHelper is None, "database dependencies not installed")
+class GetDurationsTest(unittest.TestCase):
+
+    def setUp(self):
+        # no connection needed, only the cursor is used
+        self.database = DatabaseHelper.__new__(DatabaseHelper)
+        self.database.cur = FakeCursor([(7012345678901234567, 15), (7012345678901234568, 42)])
+
+    def test_durations_keyed_by_feed_post_ids(self):
+        post_ids = ['7012345678901234567', '7012345678901234568', '7012345678901234569']
+        durations = self.database.get_durations(post_ids)
+        self.assertEqual(durations, {'7012345678901234567': 15, '7012345678901234568': 42})
+        self.assertEqual(self.database.cur.executed[0][1], (tuple(post_ids),))
+
+    def test_preloaded_durations_resolve_in_post_index(self):
+        post_index = PostIndex()
+        post_index.add_durations(self.database.get_durations(['7012345678901234567', '7012345678901234568']))
+        self.assertEqual(post_index.get_duration('7012345678901234567'), 15)
+        self.assertEqual(post_index.get_duration('7012345678901234568'), 42)
+
+    def test_no_query_without_post_ids(self):
+        self.assertEqual(self.database.get_durations([]), {})
+        self.assertEqual(self.database.cur.executed, [])
+
+
+if __name__ == '__main__':
+    unittest.main()